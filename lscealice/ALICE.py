@@ -1,13 +1,14 @@
 import os
+import queue
+import threading
+import time
 
 from typing import Iterable, cast, Any, Optional, Callable
 
 from matplotlib.patches import Rectangle
 from matplotlib.text import Text
 import numpy as np
-from numpy.ma import masked_array
 from numpy.typing import NDArray
-import pandas as pd
 
 from matplotlib.axes import Axes
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -27,14 +28,33 @@ from tkinter.filedialog import askopenfilenames, Open
 from tkinter.simpledialog import askstring
 
 from .dic import Tiepoint, initAlignmentFile, load_dic_file
-from .utils import compute_links, depth_sqz_str, map_to_ax, af_func
-from .figures import CreateFigure_main, CreateFigure_preview, eventdist
+from .utils import compute_links, project_points, af_func
+from .mapping import MAPPING_MODES
+from .figures import CreateFigure_main, CreateFigure_preview
+from .hittest import DepthIndex, nearest_to_event
 from .system import resolve_path
-from .dialogtools import export_to_csv, saveState, saveStateAs
+from .dialogtools import export_to_csv, export_all_to_csv, saveState, saveStateAs, compactState
+from .journal import TiepointJournal
+from .sheetcache import SheetCache
+from .workbook import inspect_workbook
+from .autosave import AutosaveWriter
 from .draw.limits import update_base_xlims, update_base_ylims
 from .draw.artist import update_tag, update_scatter, line, vline, scatter, text
+from .draw.blit import BlitManager
+from .draw.decimate import set_decimated_data
+from .draw.scheduler import RedrawScheduler
+from .prefetch import (
+    LinePayload,
+    PreviewPayload,
+    Prefetcher,
+    RenderCache,
+    line_key,
+    preview_key,
+)
 
 from .dialogs.newtiepoint import insert_tiepoint_dialog
+from .dialogs.overview import OverviewPanel
+from .dialogs.update import DataUpdateDialog
 
 
 class ALICE(tkinter.Frame):
@@ -68,7 +88,7 @@ class ALICE(tkinter.Frame):
         tkinter.Frame.__init__(self, parent)
         self.parent = parent
 
-        parent.title("ALICE - alignment interface for ice cores")
+        parent.title(self.window_title)
         icon_file = resolve_path("icon/lapin.png")
         parent.iconphoto(False, tkinter.PhotoImage(file=icon_file))
 
@@ -76,6 +96,13 @@ class ALICE(tkinter.Frame):
         self.initAligVariables()
         self.initUI()
 
+        # tiepoints are written to disk in a background thread
+        self.autosave = AutosaveWriter()
+
+        # and the neighbours of the profile on display are prepared in another
+        self.prefetcher = Prefetcher()
+        self.refresh_title()
+
         if filename is not None:
             self.filename = filename
             self.StartApp()
@@ -85,6 +112,31 @@ class ALICE(tkinter.Frame):
     ##########################################################################
     # function to initalize the interface
 
+    window_title = "ALICE - alignment interface for ice cores"
+
+    def refresh_title(self):
+        # show the save state of the file on display in the window title.
+        # The autosave thread does not touch tkinter, we poll it instead.
+
+        title = self.window_title
+
+        if hasattr(self, "filename"):
+            title += " - " + os.path.basename(self.filename)
+
+            if self.autosave.error is not None:
+                title += " (save failed: {})".format(self.autosave.error)
+            elif self.autosave.dirty:
+                title += " (unsaved changes)"
+            elif self.autosave.last_saved is not None:
+                title += " (saved {})".format(
+                    time.strftime("%H:%M:%S", time.localtime(self.autosave.last_saved))
+                )
+
+        if self.parent.title() != title:
+            self.parent.title(title)
+
+        self.after(250, self.refresh_title)
+
     def initFigure(self):
         # This will create the fig and ax objects
         # and all of the artists (lines, scatter plots) present in the axes
@@ -97,8 +149,48 @@ class ALICE(tkinter.Frame):
         self.CreateObjects()
 
     def canvas_draw(self):
-        self.fig.canvas.draw_idle()  # type: ignore
-        self.fig3.canvas.draw_idle()  # type: ignore
+        self.redraw.mark_stale("main")
+        self.redraw.mark_stale("preview")
+
+    def invalidate(self, data: bool = False, tiepoints: bool = False, view: bool = False):
+        # mark what changed since the last render:
+        # data: the profile or species on display (the lines),
+        # tiepoints: tiepoints added or deleted (or the mapping mode),
+        # view: the limits of axc (zoom and pan)
+        self.dirty_data |= data
+        self.dirty_tiepoints |= tiepoints
+        self.dirty_view |= view
+
+    def render(self):
+        # each stage only runs when what it depends on has changed,
+        # and invalidates the stages after it
+
+        # the preview lines only change with the data and tiepoints,
+        # otherwise only its view rectangle moves
+        redraw_preview = self.dirty_data or self.dirty_tiepoints
+
+        if self.dirty_data:
+            self.dirty_data = False
+            self.updateLines()
+            self.dirty_tiepoints = True
+
+        if self.dirty_tiepoints:
+            self.dirty_tiepoints = False
+            self.updateTiepoints()
+            self.dirty_view = True
+
+            self.prefetch_neighbours()
+
+            if self.overview is not None:
+                # only the profiles whose tiepoints changed are aligned again
+                self.overview.refresh()
+
+        if self.dirty_view:
+            self.dirty_view = False
+            self.updateView()
+
+        self.redraw.mark_stale("main")
+        self.redraw.mark_stale("preview", blit=not redraw_preview)
 
     def CreateObjects(self):
         # line 1 shows profile of profile_key in center plot
@@ -164,9 +256,35 @@ class ALICE(tkinter.Frame):
         # while we way for the selection on the second profile
         self.xp1selection = None
 
-        # hl_ind keeps track of the index of the tiepoint highlighted by hovering
+        # hl_id keeps track of the id of the tiepoint highlighted by hovering
         # so it can be deleted by right clicking
-        self.hl_ind = None
+        self.hl_id: Optional[int] = None
+
+        # tiepoint operations waiting to be appended to the journal
+        self.journal = TiepointJournal()
+
+        # decimated lines and previews of the profiles displayed
+        # (or prefetched), see get_line and get_preview
+        self.render_cache = RenderCache()
+
+        # all profiles overview window, see open_overview
+        self.overview: Optional[OverviewPanel] = None
+
+        # render pipeline, see invalidate and render
+        self.dirty_data = False
+        self.dirty_tiepoints = False
+        self.dirty_view = False
+
+        # tiepoints in the data coordinates of ax1 and ax2, see updateTiepoints
+        self.tiepoints_xy1: NDArray[np.float64] = np.empty((0, 2))
+        self.tiepoints_xy2: NDArray[np.float64] = np.empty((0, 2))
+
+        # hit-testing of the lines (rebuilt by updateLines)
+        # and of the tiepoints (rebuilt by updateTiepoints)
+        self.line_index1 = DepthIndex([], [])
+        self.line_index2 = DepthIndex([], [])
+        self.tiepoints_index1 = DepthIndex([], [])
+        self.tiepoints_index2 = DepthIndex([], [])
 
     def initUI(self):
         # crate all the buttons and dropdown menus to be greyed out
@@ -201,6 +319,16 @@ class ALICE(tkinter.Frame):
         )
         self.toolbar.update()
 
+        # the hover and selection markers and the view rectangle
+        # are blitted over the last full draw of their figure
+        self.blit_main = BlitManager(self.fig, [self.pointshl, self.tagsshow, self.xp1hl])
+        self.blit_preview = BlitManager(self.fig3, [self.rect])
+
+        # all the draws go through the scheduler
+        self.redraw = RedrawScheduler(self)
+        self.redraw.register("main", self.fig, self.blit_main)
+        self.redraw.register("preview", self.fig3, self.blit_preview)
+
         self.pack(fill=tkinter.BOTH, expand=True)  # does it need to pack itself?
 
         menubar = tkinter.Menu(self.parent)
@@ -217,13 +345,29 @@ class ALICE(tkinter.Frame):
             label="New alignment file from data file(s)", command=self.open_popup
         )
 
+        self.fileMenu.add_command(
+            label="Update from data file(s)",
+            command=self.open_update_dialog,
+            state="disabled",
+        )
+
         self.fileMenu.add_command(
             label="Export aligned data to csv",
             # command=export_to_csv(self),
-            command=lambda: export_to_csv(self.filename, self.species_on_display),
+            command=self.export_to_csv,
             state="disabled",
         )
 
+        self.fileMenu.add_command(
+            label="Export all species to csv",
+            command=self.export_all_to_csv,
+            state="disabled",
+        )
+
+        self.fileMenu.add_command(
+            label="Save", command=compactState(self), state="disabled"
+        )
+
         self.fileMenu.add_command(
             label="Save as", command=saveStateAs(self), state="disabled"
         )
@@ -239,6 +383,11 @@ class ALICE(tkinter.Frame):
             command=self.open_insert_tiepoint_dialog,
             state="disabled",
         )
+        self.toolsMenu.add_command(
+            label="All profiles overview",
+            command=self.open_overview,
+            state="disabled",
+        )
         menubar.add_cascade(label="Tools", menu=self.toolsMenu)
 
         ##################################################
@@ -247,6 +396,9 @@ class ALICE(tkinter.Frame):
         self.offset_mode_StringVar = tkinter.StringVar(self.parent)
         self.offset_mode_StringVar.set("offset mode")
 
+        self.mapping_mode_StringVar = tkinter.StringVar(self.parent)
+        self.mapping_mode_StringVar.set("linear")
+
         self.profile_on_display_StringVar = tkinter.StringVar(self.parent)
         self.profile_on_display_StringVar.set("profile on display")
 
@@ -285,6 +437,13 @@ class ALICE(tkinter.Frame):
         self.offset_mode_menu.configure(state="disabled")
         self.offset_mode_menu.pack(side=tkinter.LEFT)
 
+        # interpolation between tiepoints, see TiepointMapping
+        self.mapping_mode_menu = tkinter.OptionMenu(
+            self.parent, self.mapping_mode_StringVar, *MAPPING_MODES
+        )
+        self.mapping_mode_menu.configure(state="disabled")
+        self.mapping_mode_menu.pack(side=tkinter.LEFT)
+
         # undo redo: laissé en chantier pour l'instant
         # self.undo_button = Tkinter.Button(text='Undo',command = self.undo)
         # self.undo_button.configure(state="disabled")
@@ -333,11 +492,28 @@ class ALICE(tkinter.Frame):
             "xlim_changed", self.relim_callback
         )
 
+    def export_to_csv(self):
+        # the export reads the tiepoints from the file,
+        # make sure the autosave thread has written them
+        self.autosave.flush()
+
+        export_to_csv(self.filename, self.species_on_display, self.mapping_mode_StringVar.get())
+
+    def export_all_to_csv(self):
+        self.autosave.flush()
+
+        export_all_to_csv(self.filename, self.mapping_mode_StringVar.get())
+
     def hover_quit(self):
-        self.hl_ind = None
+        self.hl_id = None
+
+        # called on every mouse move away from the tiepoints
+        if not self.pointshl.get_visible() and not self.tagsshow.get_visible():
+            return
+
         self.pointshl.set_visible(False)
         self.tagsshow.set_visible(False)
-        self.canvas_draw()
+        self.redraw.mark_stale("main", blit=True)
 
     def hover(self, event: Event):
         assert isinstance(event, LocationEvent)
@@ -351,25 +527,20 @@ class ALICE(tkinter.Frame):
 
         if event.inaxes == self.axc:
             # we wish to find the closest point in points1 and points2
-            dist1 = eventdist(event, self.points1)
-            dist2 = eventdist(event, self.points2)
-
-            if dist1 is not None and dist2 is not None:
-                dist1 = dist1[: len(dist2)]
-                dists = np.stack((dist1, dist2))
+            # (searched in the data coordinates of ax1 and ax2)
+            nearest1 = nearest_to_event(self.tiepoints_index1, event, self.ax[0])
+            nearest2 = nearest_to_event(self.tiepoints_index2, event, self.ax[1])
 
-                ind = cast(
-                    tuple[int, int],
-                    np.unravel_index(
-                        masked_array(dists, mask=np.isnan(dists)).argmin(),  # type: ignore
-                        dists.shape,
-                    ),
-                )[1]
+            if nearest1 is not None and nearest2 is not None:
+                ind, dist = min(nearest1, nearest2, key=lambda bob: bob[1])
 
                 # TODO july 10th: instead of closest distance, use points2.contains(event)
                 # and with a ghost scatter plot for points1 (alpha = 0)
-                if np.min(dists[:, ind]) < 0.001:
-                    self.hl_ind = ind
+                if dist < 0.001:
+                    store = self.tiepoints[self.profile_on_display]
+
+                    # the tiepoint arrays are in the order of the store
+                    self.hl_id = int(store.ids[ind])
 
                     offsets1 = self.points1.get_offsets()
                     xi1, yi1 = cast(
@@ -386,14 +557,12 @@ class ALICE(tkinter.Frame):
                     update_scatter(self.pointshl, (xi1, xi2), (yi1, yi2))
                     self.pointshl.set_visible(True)
 
-                    tagstr = str(
-                        self.tiepoints[self.profile_on_display][ind]["species"]
-                    )
+                    tagstr = store.species(ind)
 
                     update_tag(self.tagsshow, xi2, yi2, tagstr)
                     # self.tagsshow = self.axc.annotate(tagstr,xy=(xi2,yi2))
                     self.tagsshow.set_visible(True)
-                    self.canvas_draw()
+                    self.redraw.mark_stale("main", blit=True)
 
                 else:
                     self.hover_quit()
@@ -410,24 +579,93 @@ class ALICE(tkinter.Frame):
 
         return depth1, signal1, depth2, signal2
 
-    def get_tiepoints(self):
-        # convert the tiepoints stored in the dictionary to the xp1 and xp2 lists
+    def get_tiepoints(self, profile: Optional[str] = None):
+        # xp1 and xp2 arrays of the tiepoints (of the profile on display by default),
+        # read-only views of the tiepoint store
+
+        if profile is None:
+            profile = self.profile_on_display
+
+        store = self.tiepoints[profile]
+
+        return store.profile_depth, store.ref_depth
+
+    def line_job(self, profile: str, species: str):
+        # key and compute function of the line payload of profile and species
+        core = self.cores[profile][species]
+
+        return line_key(profile, species), lambda: LinePayload(core)
+
+    def preview_job(self, profile: str, species: str):
+        # key and compute function of the preview payload of profile and species,
+        # for the current tiepoints of profile and mapping mode
+        core = self.cores[profile][species]
+        ref = self.cores["REF"][species]
+        xp1, xp2 = self.get_tiepoints(profile)
+        mode = self.mapping_mode_StringVar.get()
+
+        return (
+            preview_key(profile, species, xp1, xp2, mode),
+            lambda: PreviewPayload(core, ref, xp1, xp2, mode),
+        )
+
+    def get_line(self, profile: str, species: str) -> LinePayload:
+        return self.render_cache.get_or_compute(*self.line_job(profile, species))
+
+    def get_preview(self, profile: str, species: str) -> PreviewPayload:
+        return self.render_cache.get_or_compute(*self.preview_job(profile, species))
+
+    def available_keys(self):
+        # species of the profile on display and profiles with the species on display
+        species_keys_available = [
+            species
+            for species in self.species_keys
+            if species in self.cores[self.profile_on_display].keys()
+        ]
+
+        profile_keys_available = [
+            profile
+            for profile in self.profile_keys
+            if self.species_on_display in self.cores[profile].keys()
+        ]
+
+        return species_keys_available, profile_keys_available
+
+    def prefetch_neighbours(self):
+        # compute in the background what the arrow keys would display next
+        # (see on_press)
+        species_keys_available, profile_keys_available = self.available_keys()
+
+        neighbours: list[tuple[str, str]] = []
+
+        n = profile_keys_available.index(self.profile_on_display)
+        for profile in profile_keys_available[max(n - 1, 0) : n + 2]:
+            neighbours.append((profile, self.species_on_display))
 
-        xp1 = [bob["profile_depth"] for bob in self.tiepoints[self.profile_on_display]]
-        xp2 = [bob["ref_depth"] for bob in self.tiepoints[self.profile_on_display]]
+        n = species_keys_available.index(self.species_on_display)
+        for species in species_keys_available[max(n - 1, 0) : n + 2]:
+            neighbours.append((self.profile_on_display, species))
 
-        return xp1, xp2
+        jobs = []
+        for profile, species in neighbours:
+            jobs.append(self.line_job(profile, species))
+            jobs.append(self.line_job("REF", species))
+            jobs.append(self.preview_job(profile, species))
+
+        self.prefetcher.request(self.render_cache, jobs)
 
     def createTiepoint(
         self, profile: str, profile_depth: float, ref_depth: float, species: str
     ):
         new_tiepoint = Tiepoint(
-            profile_depth=profile_depth,
-            ref_depth=ref_depth,
+            profile_depth=float(profile_depth),
+            ref_depth=float(ref_depth),
             species=species,
         )
 
-        self.tiepoints[profile].append(new_tiepoint)
+        self.tiepoints[profile].insert(profile_depth, ref_depth, species)
+
+        self.journal.add(profile, new_tiepoint)
 
     def on_pick(self, event: Event):
         assert isinstance(event, MouseEvent)
@@ -452,12 +690,11 @@ class ALICE(tkinter.Frame):
             # Left click: add point
             if event.button is MouseButton.LEFT:
                 if self.xp1selection is None:
-                    dist_to_line_1 = eventdist(event, self.line1)
-                    assert dist_to_line_1 is not None
-                    # depth1 = self.line1.get_xdata()
+                    nearest = nearest_to_event(self.line_index1, event, self.ax[0])
+                    assert nearest is not None
 
-                    depth1, signal1 = zip(*self.line1.get_xydata())
-                    ind = np.nanargmin(dist_to_line_1)
+                    depth1, signal1, _depth2, _signal2 = self.get_linedata()
+                    ind = nearest[0]
                     # xp1.append(depth1[ind])
                     # temporarily store value in a class variable
                     xi1 = depth1[ind]
@@ -469,11 +706,11 @@ class ALICE(tkinter.Frame):
                     self.xp1hl.set_visible(True)
 
                 else:
-                    dist_to_line_2 = eventdist(event, self.line2)
-                    assert dist_to_line_2 is not None
+                    nearest = nearest_to_event(self.line_index2, event, self.ax[1])
+                    assert nearest is not None
 
-                    depth2 = cast(NDArray[np.float64], self.line2.get_xdata())
-                    ind = int(np.nanargmin(dist_to_line_2))
+                    _depth1, _signal1, depth2, _signal2 = self.get_linedata()
+                    ind = nearest[0]
 
                     self.createTiepoint(
                         self.profile_on_display,
@@ -490,16 +727,15 @@ class ALICE(tkinter.Frame):
             if event.button is MouseButton.RIGHT:
                 # a right click when marked points are all paired will remove the closest marked point
                 if self.xp1selection is None:
-                    # if len(self.tiepoints[self.profile_on_display]) > 0 and not self.hl_ind is None:
-                    if self.hl_ind is not None:
-                        # warning: here we rely on the fact that indices are the same
-                        # for the scatter artist points1 xy data
-                        # and for xp1,xp2 (a priori no reason that is it scrambled in points?...)
-                        # we get the index of closest distance iwth points1 xy data
-                        # and we use the same index to delete points in self.tiepoints
-                        # watch out for bugs!
+                    if self.hl_id is not None:
+                        # the highlighted tiepoint is deleted by id,
+                        # whatever its position in the store
+
+                        deleted_tiepoint = self.tiepoints[self.profile_on_display].delete(
+                            self.hl_id
+                        )
 
-                        del self.tiepoints[self.profile_on_display][self.hl_ind]
+                        self.journal.delete(self.profile_on_display, deleted_tiepoint)
 
                         self.hover_quit()
 
@@ -511,9 +747,8 @@ class ALICE(tkinter.Frame):
         # self.tiepoints_history.append(self.tiepoints)
         # self.undo_redo_callback()
 
-        self.updateTiepoints()
-
-        self.canvas_draw()
+        self.invalidate(tiepoints=True)
+        self.render()
 
         saveState(self)()
 
@@ -544,10 +779,6 @@ class ALICE(tkinter.Frame):
 
             # relim callbacks will take care of updating ax1 and ax2
             # and update rectangle view
-            self.relim_callback(self.axc)
-
-        self.updateTiepoints()
-        self.canvas_draw()
 
     def on_press(self, event: Event ):
 
@@ -558,17 +789,7 @@ class ALICE(tkinter.Frame):
         current_profile = self.profile_on_display
         current_species = self.species_on_display
 
-        species_keys_available = [
-            species
-            for species in self.species_keys
-            if species in self.cores[self.profile_on_display].keys()
-        ]
-
-        profile_keys_available = [
-            profile
-            for profile in self.profile_keys
-            if self.species_on_display in self.cores[profile].keys()
-        ]
+        species_keys_available, profile_keys_available = self.available_keys()
 
         if event.keysym == "plus":
             current_state = self.minmaxscaling_BooleanVar.get()
@@ -614,6 +835,12 @@ class ALICE(tkinter.Frame):
 
         # callbacks will take care of updating all plots
 
+    def mapping_callback(self, *_: Any):
+        # the mappings of every profile change with the mapping mode
+        # (which is part of the preview payload keys)
+        self.invalidate(tiepoints=True)
+        self.render()
+
     def offset_callback(self, *_: Any):
         # callback that catches any change to the offsetmode dropdown menu
         # and call to redraws the graph
@@ -630,23 +857,32 @@ class ALICE(tkinter.Frame):
 
         self.relim_x()
 
-    def relim_callback(self, axc: Axes):
+    def relim_callback(self, _axc: Axes):
         # callback function that catches any change to the axc limits
-        # to pass it onto ax1 and ax2 and
-        # to draw the rectangle of current view
-        # in the bottom preview
+        # (on every step of a pan), only the view needs to be updated
 
-        xlim = axc.get_xlim()
-        ylim = axc.get_ylim()
+        self.invalidate(view=True)
+        self.render()
+
+    def updateView(self):
+        # pass the axc limits onto ax1 and ax2,
+        # draw the rectangle of current view in the bottom preview
+        # and move the tiepoints and links to their new position on axt
+
+        xlim = self.axc.get_xlim()
+        ylim = self.axc.get_ylim()
 
         xlim = np.array(xlim)
         ylim = np.array(ylim)
 
         # first version: we have set the base limits of axc and axt to be (0,1)
         xlim1 = af_func(xlim, 0, 1, self.base_xlim1[0], self.base_xlim1[1])
-        ylim1 = af_func(ylim, 0, 1, self.base_ylim1[0], self.base_ylim1[1])
-
         xlim2 = af_func(xlim, 0, 1, self.base_xlim2[0], self.base_xlim2[1])
+
+        # the 100% y view fits the signals shown between these x limits
+        update_base_ylims(self, (xlim1[0], xlim1[1]), (xlim2[0], xlim2[1]))
+
+        ylim1 = af_func(ylim, 0, 1, self.base_ylim1[0], self.base_ylim1[1])
         ylim2 = af_func(ylim, 0, 1, self.base_ylim2[0], self.base_ylim2[1])
 
         self.axt.set_xlim(tuple(xlim))
@@ -668,8 +904,11 @@ class ALICE(tkinter.Frame):
         self.rect.set_width(xrange)
         self.rect.set_height(yrange)
 
-        self.updateTiepoints()
-        self.canvas_draw()
+        # as many vertices as pixels in the view
+        set_decimated_data(self.line1, self.pyramid1, self.ax[0])
+        set_decimated_data(self.line2, self.pyramid2, self.ax[1])
+
+        self.projectTiepoints()
 
     def updateUI(self):
         # function called upon change of species and change of profile
@@ -712,7 +951,7 @@ class ALICE(tkinter.Frame):
 
         self.updateUI()
 
-        self.updateLines()
+        self.invalidate(data=True)
 
         # behaviour to discuss: do we keep the focus in the x direction
         # (for instance when switching between species at fixed profile)
@@ -720,11 +959,10 @@ class ALICE(tkinter.Frame):
 
         # self.relim_x()
 
+        # the relim callback renders the new lines
         self.relim_y()
 
-        self.updateTiepoints()
-
-        self.canvas_draw()
+        self.render()
 
     def manual_offset_input(self):
         inputvalue = askstring(title="test", prompt="Enter manual offset value")
@@ -740,6 +978,14 @@ class ALICE(tkinter.Frame):
         self.relim_x()
 
     def _quit(self):
+        if hasattr(self, "filename"):
+            # write pending tiepoints and
+            # fold the tiepoints journal back into the alignment file
+            compactState(self)()
+
+        self.autosave.close()
+        self.prefetcher.close()
+
         print("goodbye")
         self.parent.quit()  # stops mainloop
         self.parent.destroy()  # this is necessary on Windows to prevent
@@ -750,8 +996,15 @@ class ALICE(tkinter.Frame):
     def loadData(self):
         # run only once at the opening of the file
 
+        # tiepoints from the journal are replayed over the file content
         new_dic = load_dic_file(self.filename)
 
+        self.journal = TiepointJournal()
+        self.render_cache = RenderCache()
+
+        if self.overview is not None:
+            self.overview.close()
+
         # load tiepoints and cores data in separate dictionaries
         self.tiepoints = new_dic["tiepoints"]
         self.cores = new_dic["cores"]
@@ -798,19 +1051,24 @@ class ALICE(tkinter.Frame):
 
         # UPDATE DATA
 
-        self.line1.set_xdata(depth1)
-        self.line1.set_ydata(signal1)
+        # line1 and line2 are drawn from these by updateView,
+        # picking uses the full resolution data
+        line1 = self.get_line(self.profile_on_display, self.species_on_display)
+        line2 = self.get_line("REF", self.species_on_display)
 
-        self.line2.set_xdata(depth2)
-        self.line2.set_ydata(signal2)
+        self.pyramid1 = line1.pyramid
+        self.pyramid2 = line2.pyramid
 
-        self.line4.set_xdata(depth2)  # redundent
-        self.line4.set_ydata(signal2)
+        self.line_index1 = line1.index
+        self.line_index2 = line2.index
 
         # update 100% view xlims
         update_base_xlims(self)
         update_base_ylims(self)
 
+        # the preview always shows the whole reference
+        set_decimated_data(self.line4, self.pyramid2, self.ax3)
+
         # self.text_date.set_text(date1.date())
 
         self.text_profile.set_text(self.profile_on_display)
@@ -862,10 +1120,11 @@ class ALICE(tkinter.Frame):
         return anchor1, anchor2
 
     def updateTiepoints(self):
-        # A function to be called each time we manipulate tiepoints:
-        # redraws the preview in the bottom graph
-        # redraws the tiepoints and
-        # redraws the links
+        # A function to be called each time we manipulate tiepoints
+        # (through invalidate(tiepoints=True) and render):
+        # locates the tiepoints on the lines and
+        # redraws the preview in the bottom graph.
+        # The tiepoints and links are then drawn by projectTiepoints
 
         # defining shortnames for readability
 
@@ -877,26 +1136,21 @@ class ALICE(tkinter.Frame):
         yp1 = np.interp(xp1, depth1, signal1)
         yp2 = np.interp(xp2, depth2, signal2)
 
-        xp1t, yp1t = map_to_ax(self.ax[0], self.axt, xp1, yp1)
-        xp2t, yp2t = map_to_ax(self.ax[1], self.axt, xp2, yp2)
-
-        # update tiepoints
-
-        self.points1.set_offsets(np.c_[xp1t, yp1t])
-        self.points2.set_offsets(np.c_[xp2t, yp2t])
-        # self.links.set_data(xp_links,yp_links)
+        # kept for the view changes, which only move the tiepoints on axt
+        self.tiepoints_xy1 = np.column_stack((xp1, yp1))
+        self.tiepoints_xy2 = np.column_stack((xp2, yp2))
 
-        xp_links, yp_links = compute_links(xp1t, xp2t, yp1t, yp2t)
-        self.links.set_data(xp_links, yp_links)
+        self.tiepoints_index1 = DepthIndex(xp1, yp1)
+        self.tiepoints_index2 = DepthIndex(xp2, yp2)
 
         # update preview
 
-        depth_new = depth_sqz_str(depth1, xp1, xp2)
+        preview = self.get_preview(self.profile_on_display, self.species_on_display)
 
-        signal_new = np.interp(depth2, depth_new, signal1, left=np.nan, right=np.nan)
+        # crossing tiepoints make the alignment fold over itself
+        self.links.set_color("red" if preview.mapping.has_crossings else "grey")
 
-        self.line3.set_xdata(depth2)  # redundent
-        self.line3.set_ydata(signal_new)
+        set_decimated_data(self.line3, preview.pyramid, self.ax3)
 
         # Set highlight
 
@@ -908,6 +1162,22 @@ class ALICE(tkinter.Frame):
             self.line1.set_linewidth(1.5)
             self.line2.set_linewidth(3)
 
+    def projectTiepoints(self):
+        # redraws the tiepoints and the links on axt for the current view,
+        # from the data coordinates computed by updateTiepoints
+
+        # one transform per axis for all the tiepoints
+        xy1t = project_points(self.ax[0], self.axt, self.tiepoints_xy1)
+        xy2t = project_points(self.ax[1], self.axt, self.tiepoints_xy2)
+
+        # update tiepoints
+
+        self.points1.set_offsets(xy1t)
+        self.points2.set_offsets(xy2t)
+
+        xp_links, yp_links = compute_links(xy1t, xy2t)
+        self.links.set_data(xp_links, yp_links)
+
     def relim_xy(self):
         # weird behaviour; if we only call relim_x, the relim_callback function
         # will not be called
@@ -953,6 +1223,7 @@ class ALICE(tkinter.Frame):
         self.resetview_button.configure(state="normal")
         self.offset_mode_menu.configure(state="normal")
         self.offset_mode_StringVar.set(default_offset_mode)
+        self.mapping_mode_menu.configure(state="normal")
 
         self.species_menu.configure(state="normal")
         self.species_on_display_StringVar.set(str(self.species_on_display))
@@ -963,6 +1234,7 @@ class ALICE(tkinter.Frame):
 
         # only now attribute callbacks
         self.offset_mode_StringVar.trace_add("write", self.offset_callback)
+        self.mapping_mode_StringVar.trace_add("write", self.mapping_callback)
         self.profile_on_display_StringVar.trace_add("write", self.Var_callback)
         self.species_on_display_StringVar.trace_add("write", self.Var_callback)
         self.minmaxscaling_BooleanVar.trace_add("write", self.Var_callback)
@@ -981,17 +1253,26 @@ class ALICE(tkinter.Frame):
         # highlight marked points when hovering
         self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
 
+        self.fileMenu.entryconfig("Save", state="normal")
         self.fileMenu.entryconfig("Save as", state="normal")
+        self.fileMenu.entryconfig("Update from data file(s)", state="normal")
         self.fileMenu.entryconfig("Export aligned data to csv", state="normal")
+        self.fileMenu.entryconfig("Export all species to csv", state="normal")
 
         # and enable the tool menu
         self.toolsMenu.entryconfig("Add tiepoint manually", state="normal")
+        self.toolsMenu.entryconfig("All profiles overview", state="normal")
 
         # test
         # fig.canvas.mpl_connect("motion_notify_event", hover)
 
     def onOpenAlig(self):
-        ftypes = [("Pickle files", "*.pkl"), ("All files", "*")]
+        ftypes = [
+            ("Alignment files", "*.pkl *.alice"),
+            ("Pickle files", "*.pkl"),
+            ("Columnar ALICE files", "*.alice"),
+            ("All files", "*"),
+        ]
         dlg = Open(self, filetypes=ftypes)
         fl: str = dlg.show()  # type: ignore
 
@@ -1009,11 +1290,11 @@ class ALICE(tkinter.Frame):
         self.enableUI()
         self.updateUI()
 
-        self.updateLines()
-        self.relim_xy()
-        # self.updateTiepoints()
+        self.invalidate(data=True)
 
-        # self.canvas_draw()
+        # the relim callback renders the lines, tiepoints and view
+        self.relim_xy()
+        self.render()
 
     ################################################################
     ################################################################
@@ -1021,6 +1302,15 @@ class ALICE(tkinter.Frame):
     # create a new tiepoint via the Tools menu
 
 
+    def open_overview(self):
+        if self.overview is None:
+            self.overview = OverviewPanel(tkinter.Toplevel(self), self)
+        else:
+            self.overview.top.lift()
+
+    def open_update_dialog(self):
+        DataUpdateDialog(tkinter.Toplevel(self), self)
+
     def open_insert_tiepoint_dialog(self):
 
         def on_confirm(profile_depth: float, ref_depth: float):
@@ -1031,9 +1321,8 @@ class ALICE(tkinter.Frame):
                 "Manual",
             )
 
-            self.updateTiepoints()
-
-            self.canvas_draw()
+            self.invalidate(tiepoints=True)
+            self.render()
 
             saveState(self)()
 
@@ -1053,7 +1342,7 @@ class ALICE(tkinter.Frame):
 
         top = self.top
 
-        top.geometry("500x250")
+        top.geometry("500x450")
         top.title("Create alignment from data files")
 
         self.opendataButton = tkinter.Button(
@@ -1068,6 +1357,10 @@ class ALICE(tkinter.Frame):
         )
         self.selected_datafiles_Label.pack(side=tkinter.TOP)
 
+        # sheets, dimensions and columns of the data files
+        self.sheets_preview_Text = tkinter.Text(top, height=8, state="disabled")
+        self.sheets_preview_Text.pack(side=tkinter.TOP, fill=tkinter.X)
+
         self.opendataButton = tkinter.Button(
             master=top, text="Select metadata files", command=self.onOpenMeta
         )
@@ -1110,6 +1403,10 @@ class ALICE(tkinter.Frame):
         self.create_alignmentButton.configure(state="disabled")
         self.create_alignmentButton.pack(side=tkinter.BOTTOM)
 
+        # files parsed so far while the alignment file is created
+        self.ingest_progress_Label = tkinter.Label(top, text="")
+        self.ingest_progress_Label.pack(side=tkinter.BOTTOM)
+
     def createAlignmentFile(self):
         # collect all the parameters
         datafiles = self.selected_datafiles
@@ -1129,11 +1426,61 @@ class ALICE(tkinter.Frame):
         else:
             max_depth = int(max_depth)
 
-        # create the dictionary
-        # this is a mess, rewrite later to only use one dictionary state
-        new_dic = initAlignmentFile(
-            datafiles, metadatafiles, ref_lab, min_depth, max_depth
-        )
+        # the files are parsed in a background thread (and a pool of processes)
+        # so that the popup shows the progress instead of freezing
+        self.create_alignmentButton.configure(state="disabled")
+
+        progress: "queue.Queue[tuple[str, int, int]]" = queue.Queue()
+        outcome: dict[str, Any] = {}
+
+        def ingest():
+            try:
+                # create the dictionary
+                # this is a mess, rewrite later to only use one dictionary state
+                outcome["dic"] = initAlignmentFile(
+                    datafiles,
+                    metadatafiles,
+                    ref_lab,
+                    min_depth,
+                    max_depth,
+                    workers=os.cpu_count() or 1,
+                    progress=lambda *bob: progress.put(bob),
+                    sheet_cache=SheetCache(),
+                )
+            except Exception as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=ingest, name="alice-ingest", daemon=True)
+        thread.start()
+
+        self.poll_ingestion(thread, progress, outcome)
+
+    def poll_ingestion(
+        self,
+        thread: threading.Thread,
+        progress: "queue.Queue[tuple[str, int, int]]",
+        outcome: dict[str, Any],
+    ):
+        # the popup was closed while the files were read
+        if not self.top.winfo_exists():
+            return
+
+        while not progress.empty():
+            datafile, done, total = progress.get()
+            self.ingest_progress_Label.configure(
+                text=f"{done}/{total} files read ({os.path.basename(datafile)})"
+            )
+
+        if thread.is_alive():
+            self.after(100, self.poll_ingestion, thread, progress, outcome)
+            return
+
+        if "error" in outcome:
+            self.ingest_progress_Label.configure(text=f"failed: {outcome['error']}")
+            self.create_alignmentButton.configure(state="normal")
+            return
+
+        new_dic = outcome["dic"]
 
         # save the new state to a new file
         self.tiepoints = new_dic["tiepoints"]
@@ -1165,7 +1512,12 @@ class ALICE(tkinter.Frame):
     def onOpenData(self):
         workdir = os.getcwd()
 
-        ftypes = [("Excel files", "*.xlsx"), ("All files", "*")]
+        ftypes = [
+            ("Data files", "*.xlsx *.csv *.tsv"),
+            ("Excel files", "*.xlsx"),
+            ("CSV files", "*.csv *.tsv"),
+            ("All files", "*"),
+        ]
         filez = cast(
             Iterable[str], askopenfilenames(initialdir=workdir, filetypes=ftypes)
         )
@@ -1176,16 +1528,6 @@ class ALICE(tkinter.Frame):
         string_for_label = " ".join([file + " \n " for file in filez_for_label])
         self.selected_datafiles_Label.configure(text=string_for_label)
 
-        temp: list[str] = []
-
-        for datafile in filez:
-            xls = pd.ExcelFile(datafile)
-            core_names = xls.sheet_names[:]
-            temp.extend(map(str, core_names))
-
-        references_available = set(temp)
-
-        self.reference_menu.configure(state="normal")
         self.maxdepth.configure(state="normal")
         self.mindepth.configure(state="normal")
         # not here
@@ -1193,12 +1535,74 @@ class ALICE(tkinter.Frame):
 
         menu = self.reference_menu["menu"]
         menu.delete(0, "end")
-        for string in references_available:
-            menu.add_command(
-                label=string,
-                command=lambda value=string: self.reference_selected_StringVar.set(
-                    value
-                ),
-            )
+
+        self.sheets_preview_Text.configure(state="normal")
+        self.sheets_preview_Text.delete("1.0", "end")
+        self.sheets_preview_Text.configure(state="disabled")
+
+        # the sheets are listed from the workbook manifests in a background
+        # thread, the reference menu is filled as each file is inspected
+        inspected: "queue.Queue[tuple[str, Any]]" = queue.Queue()
+
+        def inspect():
+            for datafile in filez:
+                try:
+                    inspected.put((datafile, inspect_workbook(datafile)))
+                except Exception as e:
+                    inspected.put((datafile, e))
+
+        thread = threading.Thread(target=inspect, name="alice-inspect", daemon=True)
+        thread.start()
+
+        # a new selection replaces the files being inspected
+        self.inspection = thread
+
+        self.poll_inspection(thread, inspected, set())
+
+    def poll_inspection(
+        self,
+        thread: threading.Thread,
+        inspected: "queue.Queue[tuple[str, Any]]",
+        references_available: set[str],
+    ):
+        if thread is not self.inspection or not self.top.winfo_exists():
+            return
+
+        menu = self.reference_menu["menu"]
+
+        while not inspected.empty():
+            datafile, sheets = inspected.get()
+
+            lines = [os.path.basename(datafile)]
+
+            if isinstance(sheets, Exception):
+                lines.append(f"    could not be read: {sheets}")
+                sheets = []
+
+            for sheet in sheets:
+                rows = "?" if sheet["rows"] is None else sheet["rows"]
+                columns = "?" if sheet["columns"] is None else sheet["columns"]
+                lines.append(
+                    f"    {sheet['name']}: {rows} rows, {columns} columns"
+                    + (" (" + ", ".join(sheet["header"]) + ")" if sheet["header"] else "")
+                )
+
+                if sheet["name"] not in references_available:
+                    references_available.add(sheet["name"])
+
+                    menu.add_command(
+                        label=sheet["name"],
+                        command=lambda value=sheet["name"]: (
+                            self.reference_selected_StringVar.set(value)
+                        ),
+                    )
+                    self.reference_menu.configure(state="normal")
+
+            self.sheets_preview_Text.configure(state="normal")
+            self.sheets_preview_Text.insert("end", "\n".join(lines) + "\n")
+            self.sheets_preview_Text.configure(state="disabled")
+
+        if thread.is_alive() or not inspected.empty():
+            self.after(100, self.poll_inspection, thread, inspected, references_available)
 
 
@@ -3,10 +3,14 @@
 import tkinter
 import os.path
 
-from lscealice.ALICE import ALICE
+
+# the gui is only imported when launched: processes spawned by the gui
+# (see dic.parse_files) import this package without tkinter and matplotlib
 
 
 def main():
+    from lscealice.ALICE import ALICE
+
     root = tkinter.Tk()
 
     ALICE(root)
@@ -19,6 +23,8 @@ def launch():
 
 
 def quicklaunch():
+    from lscealice.ALICE import ALICE
+
     root = tkinter.Tk()
 
     assert os.path.isfile("test.pkl")
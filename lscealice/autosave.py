@@ -0,0 +1,122 @@
+import threading
+import time
+
+from typing import Optional
+
+from .journal import Record, append_records
+
+
+class AutosaveWriter:
+    # appends the tiepoints journal records in a background thread
+    # so that editing tiepoints never waits for the disk.
+    # Records submitted in a burst (e.g. ten quick clicks) are coalesced
+    # and written in a single append once no new record came in for `delay`
+    # seconds, or at the latest `max_delay` seconds after the first one.
+
+    def __init__(self, delay: float = 0.5, max_delay: float = 5.0):
+        self.delay = delay
+        self.max_delay = max_delay
+
+        self.condition = threading.Condition()
+
+        self.records: dict[str, list[Record]] = {}
+        self.first_submit = 0.0
+        self.last_submit = 0.0
+        self.writing = False
+        self.closed = False
+
+        # read by the interface to show the save state
+        self.last_saved: Optional[float] = None
+        self.error: Optional[Exception] = None
+
+        self.thread = threading.Thread(
+            target=self.run, name="alice-autosave", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, filename: str, records: list[Record]):
+        if not records:
+            return
+
+        with self.condition:
+            now = time.monotonic()
+            if not self.records:
+                self.first_submit = now
+            self.last_submit = now
+
+            self.records.setdefault(filename, []).extend(records)
+            self.condition.notify_all()
+
+    @property
+    def dirty(self):
+        with self.condition:
+            return bool(self.records) or self.writing
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.records and not self.closed:
+                    self.condition.wait()
+
+                if not self.records:
+                    # closed and nothing left to write
+                    return
+
+                while not self.closed:
+                    now = time.monotonic()
+                    remaining = min(
+                        self.last_submit + self.delay - now,
+                        self.first_submit + self.max_delay - now,
+                    )
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+
+                batch, self.records = self.records, {}
+                self.writing = True
+
+            error = None
+            try:
+                for filename, records in batch.items():
+                    append_records(filename, records)
+            except Exception as e:
+                error = e
+
+            with self.condition:
+                self.writing = False
+                self.error = error
+
+                if error is None:
+                    self.last_saved = time.time()
+                else:
+                    # keep the records (in order) and try again later
+                    for filename, records in batch.items():
+                        records.extend(self.records.get(filename, []))
+                        self.records[filename] = records
+                    self.first_submit = self.last_submit = time.monotonic()
+
+                self.condition.notify_all()
+
+                if error is not None and self.closed:
+                    # do not retry forever when the interface is closing
+                    return
+
+    def flush(self):
+        # block until every record submitted so far has been written
+        # (or until writing failed)
+        with self.condition:
+            # skip the coalescing delay
+            self.first_submit = self.last_submit = 0.0
+            self.condition.notify_all()
+
+            while self.records or self.writing:
+                self.condition.wait()
+                if self.error is not None:
+                    break
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        self.thread.join()
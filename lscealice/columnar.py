@@ -0,0 +1,244 @@
+import json
+import mmap
+import os
+import struct
+
+from pickle import dumps, loads
+from typing import Any, Iterable, TYPE_CHECKING, cast
+
+import numpy as np
+from numpy.typing import NDArray
+
+if TYPE_CHECKING:
+    from .dic import Dic, Cores
+
+# Layout of a columnar alignment file:
+#
+#   MAGIC
+#   every core array, raw and aligned on ALIGNMENT bytes
+#   pickled metadata
+#   pickled tiepoints
+#   json header indexing the cores arrays and the two pickled blocks
+#   FOOTER pointing to the json header
+#
+# Since the header is found from the end of the file, new blocks and a new
+# header can be appended without touching the arrays already written.
+
+MAGIC = b"ALICECOL"
+FOOTER_MAGIC = b"ALICEIDX"
+FOOTER = struct.Struct("<8sQQ")
+ALIGNMENT = 64
+VERSION = 1
+
+Entry = dict[str, Any]
+
+
+def is_columnar_file(filename: str) -> bool:
+    if not os.path.isfile(filename):
+        return False
+
+    with open(filename, "rb") as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+
+def _write_array(fp: Any, array: NDArray[Any], written: dict[int, Entry]) -> Entry:
+    # arrays shared between cores (the REF core is a copy of another core)
+    # are only written once
+    if id(array) in written:
+        return written[id(array)]
+
+    contiguous = np.ascontiguousarray(array)
+
+    if contiguous.dtype.hasobject:
+        raise ValueError("cannot store arrays of python objects in a columnar file")
+
+    fp.write(b"\0" * (-fp.tell() % ALIGNMENT))
+
+    entry = {
+        "offset": fp.tell(),
+        "dtype": contiguous.dtype.str,
+        "shape": list(contiguous.shape),
+    }
+
+    fp.write(memoryview(contiguous).cast("B"))
+
+    written[id(array)] = entry
+
+    return entry
+
+
+def _write_cores(fp: Any, cores: "dict[str, dict[str, Cores]]", written: dict[int, Entry]):
+    return {
+        lab: {
+            species: {
+                "depth": _write_array(fp, core["depth"], written),
+                "data": _write_array(fp, core["data"], written),
+            }
+            for species, core in core_dic.items()
+        }
+        for lab, core_dic in cores.items()
+    }
+
+
+def _write_blob(fp: Any, obj: Any) -> Entry:
+    data = dumps(obj)
+
+    entry = {"offset": fp.tell(), "length": len(data)}
+    fp.write(data)
+
+    return entry
+
+
+def _write_header(fp: Any, header: Entry):
+    data = json.dumps(header).encode("utf-8")
+
+    offset = fp.tell()
+    fp.write(data)
+    fp.write(FOOTER.pack(FOOTER_MAGIC, offset, len(data)))
+
+
+def write_columnar_file(dic: "Dic", filename: str):
+    tmpfilename = filename + ".tmp"
+
+    with open(tmpfilename, "wb") as fp:
+        fp.write(MAGIC)
+
+        header: Entry = {"version": VERSION}
+        header["cores"] = _write_cores(fp, dic["cores"], {})
+        header["metadata"] = _write_blob(fp, dic["metadata"])
+        header["tiepoints"] = _write_blob(fp, dic["tiepoints"])
+
+        _write_header(fp, header)
+
+    os.replace(tmpfilename, filename)
+
+
+def _find_footer(fp: Any) -> tuple[int, int]:
+    fp.seek(0, os.SEEK_END)
+    size = fp.tell()
+
+    fp.seek(size - FOOTER.size)
+    magic, offset, length = FOOTER.unpack(fp.read(FOOTER.size))
+
+    if magic == FOOTER_MAGIC and offset + length + FOOTER.size == size:
+        return offset, length
+
+    # an interrupted append left garbage after the last complete header,
+    # fall back to the previous footer
+    with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = size
+        while True:
+            position = mm.rfind(FOOTER_MAGIC, len(MAGIC), end)
+            if position < 0:
+                raise ValueError("no valid header found in columnar file")
+
+            magic, offset, length = FOOTER.unpack(mm[position : position + FOOTER.size])
+            if offset + length == position:
+                return offset, length
+
+            end = position
+
+
+def read_columnar_header(filename: str) -> Entry:
+    with open(filename, "rb") as fp:
+        offset, length = _find_footer(fp)
+        fp.seek(offset)
+        return json.loads(fp.read(length))
+
+
+def _read_blob(filename: str, entry: Entry) -> Any:
+    with open(filename, "rb") as fp:
+        fp.seek(entry["offset"])
+        return loads(fp.read(entry["length"]))
+
+
+def _nbytes(entry: Entry) -> int:
+    return int(np.prod(entry["shape"])) * np.dtype(entry["dtype"]).itemsize
+
+
+def load_columnar_file(filename: str):
+    header = read_columnar_header(filename)
+
+    entries = [
+        entry
+        for core_dic in header["cores"].values()
+        for core in core_dic.values()
+        for entry in core.values()
+    ]
+
+    arrays_end = max(
+        [len(MAGIC)] + [entry["offset"] + _nbytes(entry) for entry in entries]
+    )
+
+    # a single read-only mapping of the arrays region: opening the file does
+    # not read any data, pages are only loaded when a profile is displayed
+    mm = np.asarray(np.memmap(filename, dtype=np.uint8, mode="r", shape=(arrays_end,)))
+
+    views: dict[int, NDArray[Any]] = {}
+
+    def view(entry: Entry) -> NDArray[np.float64]:
+        offset = entry["offset"]
+        if offset not in views:
+            views[offset] = (
+                mm[offset : offset + _nbytes(entry)]
+                .view(np.dtype(entry["dtype"]))
+                .reshape(entry["shape"])
+            )
+        return views[offset]
+
+    cores = {
+        lab: {
+            species: {"depth": view(core["depth"]), "data": view(core["data"])}
+            for species, core in core_dic.items()
+        }
+        for lab, core_dic in header["cores"].items()
+    }
+
+    return cast(
+        "Dic",
+        {
+            "cores": cores,
+            "metadata": _read_blob(filename, header["metadata"]),
+            "tiepoints": _read_blob(filename, header["tiepoints"]),
+        },
+    )
+
+
+def append_columnar_tiepoints(filename: str, tiepoints: Any):
+    # only the tiepoints block and the header are appended,
+    # the previous tiepoints block is left behind as garbage
+    # until the file is rewritten with write_columnar_file
+    header = read_columnar_header(filename)
+
+    with open(filename, "ab") as fp:
+        header["tiepoints"] = _write_blob(fp, tiepoints)
+        _write_header(fp, header)
+
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def append_columnar_cores(filename: str, dic: "Dic", changed: Iterable[tuple[str, str]]):
+    # only the arrays of the changed (profile, species) cores, the metadata
+    # and tiepoints blocks and the header are appended, the arrays of the
+    # other cores are not touched. The previous arrays and blocks are left
+    # behind as garbage until the file is rewritten with write_columnar_file
+    header = read_columnar_header(filename)
+
+    written: dict[int, Entry] = {}
+
+    with open(filename, "ab") as fp:
+        for lab, species in changed:
+            core = dic["cores"][lab][species]
+
+            header["cores"].setdefault(lab, {})[species] = {
+                "depth": _write_array(fp, core["depth"], written),
+                "data": _write_array(fp, core["data"], written),
+            }
+
+        header["metadata"] = _write_blob(fp, dic["metadata"])
+        header["tiepoints"] = _write_blob(fp, dic["tiepoints"])
+        _write_header(fp, header)
+
+        fp.flush()
+        os.fsync(fp.fileno())
@@ -0,0 +1,151 @@
+import tkinter
+from typing import TYPE_CHECKING, Any, Optional
+
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends._backend_tk import NavigationToolbar2Tk
+from matplotlib.collections import LineCollection
+
+from ..draw.artist import line
+from ..overview import AlignedProfiles
+from ..plt import plt
+
+if TYPE_CHECKING:
+    from ..ALICE import ALICE
+
+
+class OverviewPanel:
+    # every aligned profile of the species on display against the reference
+    # depths, drawn as a single LineCollection, stacked or overlaid.
+    # The profile on display is highlighted. ALICE calls refresh after each
+    # change of tiepoints, species or mapping mode.
+
+    def __init__(self, top: tkinter.Toplevel, alice: "ALICE"):
+        self.top = top
+        self.alice = alice
+
+        top.title("All profiles overview")
+        top.geometry("900x700")
+
+        self.fig, self.ax = plt.subplots()  # type: ignore
+        plt.close()
+
+        self.collection = LineCollection([], linewidths=0.6, colors="darkblue", alpha=0.6)
+        self.ax.add_collection(self.collection)
+
+        self.highlight = line(self.ax, "red", lw=1.2)
+
+        self.stacked_BooleanVar = tkinter.BooleanVar(top)
+        self.stacked_BooleanVar.set(True)
+
+        tkinter.Checkbutton(
+            top, text="stacked", variable=self.stacked_BooleanVar, command=self.relim
+        ).pack(side=tkinter.TOP)
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=top)
+        self.canvas.get_tk_widget().pack(side=tkinter.TOP, fill=tkinter.BOTH, expand=True)
+
+        self.toolbar = NavigationToolbar2Tk(self.canvas, top)
+        self.toolbar.update()
+
+        self.aligned: Optional[AlignedProfiles] = None
+
+        alice.redraw.register("overview", self.fig)
+
+        # the profiles are decimated again for each view
+        self.ax.callbacks.connect("xlim_changed", self.on_xlim_changed)  # type: ignore
+
+        top.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.refresh()
+
+    def refresh(self):
+        alice = self.alice
+        species = alice.species_on_display
+        mode = alice.mapping_mode_StringVar.get()
+
+        new_species = self.aligned is None or (self.aligned.species, self.aligned.mode) != (
+            species,
+            mode,
+        )
+
+        if new_species:
+            self.aligned = AlignedProfiles(alice.cores, species, mode)
+
+        assert self.aligned is not None
+
+        changed = self.aligned.refresh(alice.tiepoints)
+
+        if new_species:
+            self.relim()
+        elif changed:
+            self.update_segments()
+
+        self.update_highlight()
+        alice.redraw.mark_stale("overview")
+
+    def relim(self):
+        assert self.aligned is not None
+
+        depth = self.aligned.depth
+        n = len(self.aligned.profiles)
+
+        self.ax.set_title(self.aligned.species)
+
+        if self.stacked_BooleanVar.get():
+            step = max(1, n // 40)
+            self.ax.set_yticks(range(0, n, step))
+            self.ax.set_yticklabels(self.aligned.profiles[::step], fontsize=6)
+            self.ax.set_ylim(-0.5, n + 0.5)
+        else:
+            self.ax.set_yticks([])
+
+            lows = [lo for lo, _ in self.aligned.ranges.values()]
+            highs = [hi for _, hi in self.aligned.ranges.values()]
+            if lows:
+                self.ax.set_ylim(min(lows), max(highs))
+
+        if len(depth):
+            self.ax.set_xlim(float(depth.min()), float(depth.max()))
+
+        self.update_segments()
+        self.update_highlight()
+        self.alice.redraw.mark_stale("overview")
+
+    def on_xlim_changed(self, _ax: Axes):
+        self.update_segments()
+        self.update_highlight()
+        self.alice.redraw.mark_stale("overview")
+
+    def update_segments(self):
+        assert self.aligned is not None
+
+        xmin, xmax = sorted(self.ax.get_xlim())
+
+        self.collection.set_segments(
+            self.aligned.segments(
+                xmin, xmax, int(self.ax.bbox.width), stacked=self.stacked_BooleanVar.get()
+            )
+        )
+
+    def update_highlight(self):
+        assert self.aligned is not None
+
+        profile = self.alice.profile_on_display
+
+        if profile not in self.aligned.pyramids:
+            self.highlight.set_data([], [])
+            return
+
+        xmin, xmax = sorted(self.ax.get_xlim())
+
+        segment = self.aligned.segment(
+            profile, xmin, xmax, int(self.ax.bbox.width), stacked=self.stacked_BooleanVar.get()
+        )
+
+        self.highlight.set_data(segment[:, 0], segment[:, 1])
+
+    def close(self, *_: Any):
+        self.alice.redraw.unregister("overview")
+        self.alice.overview = None
+        self.top.destroy()
@@ -0,0 +1,186 @@
+import os
+import queue
+import threading
+import tkinter
+from tkinter.filedialog import askopenfilenames
+from typing import TYPE_CHECKING, Any, Optional
+
+import numpy as np
+
+from ..dialogtools import saveState
+from ..dic import Dic, parse_files, write_cores
+from ..sheetcache import SheetCache
+from ..update import DataUpdate
+
+if TYPE_CHECKING:
+    from ..ALICE import ALICE
+
+
+class DataUpdateDialog:
+    # updates the open alignment file with data files the lab reprocessed:
+    # the new sheets are compared with the stored cores and metadata,
+    # the changes are listed, and only the changed cores are written
+    # when applied. Tiepoints are kept.
+
+    def __init__(self, top: tkinter.Toplevel, alice: "ALICE"):
+        self.top = top
+        self.alice = alice
+
+        top.title("Update from data files")
+        top.geometry("600x450")
+
+        self.datafiles: tuple[str, ...] = ()
+        self.metadatafiles: tuple[str, ...] = ()
+
+        tkinter.Button(top, text="Select data files", command=self.on_open_data).pack(
+            side=tkinter.TOP
+        )
+        self.datafiles_Label = tkinter.Label(top, text="")
+        self.datafiles_Label.pack(side=tkinter.TOP)
+
+        tkinter.Button(top, text="Select metadata files", command=self.on_open_meta).pack(
+            side=tkinter.TOP
+        )
+        self.metadatafiles_Label = tkinter.Label(top, text="")
+        self.metadatafiles_Label.pack(side=tkinter.TOP)
+
+        # the depth window the file was created with
+        window = tkinter.Frame(top)
+        window.pack(side=tkinter.TOP)
+
+        tkinter.Label(window, text="min depth: ").pack(side=tkinter.LEFT)
+        self.mindepth = tkinter.Entry(window, width=6)
+        self.mindepth.pack(side=tkinter.LEFT)
+
+        tkinter.Label(window, text="max depth: ").pack(side=tkinter.LEFT)
+        self.maxdepth = tkinter.Entry(window, width=6)
+        self.maxdepth.pack(side=tkinter.LEFT)
+
+        self.compare_button = tkinter.Button(
+            top, text="Compare", command=self.on_compare, state="disabled"
+        )
+        self.compare_button.pack(side=tkinter.TOP)
+
+        self.apply_button = tkinter.Button(
+            top, text="Apply", command=self.on_apply, state="disabled"
+        )
+        self.apply_button.pack(side=tkinter.BOTTOM)
+
+        self.summary_Text = tkinter.Text(top, height=12, state="disabled")
+        self.summary_Text.pack(side=tkinter.TOP, fill=tkinter.BOTH, expand=True)
+
+        self.update: Optional[DataUpdate] = None
+
+    def show(self, text: str):
+        self.summary_Text.configure(state="normal")
+        self.summary_Text.delete("1.0", "end")
+        self.summary_Text.insert("end", text)
+        self.summary_Text.configure(state="disabled")
+
+    def on_open_data(self):
+        ftypes = [
+            ("Data files", "*.xlsx *.csv *.tsv"),
+            ("Excel files", "*.xlsx"),
+            ("CSV files", "*.csv *.tsv"),
+            ("All files", "*"),
+        ]
+        self.datafiles = tuple(askopenfilenames(initialdir=os.getcwd(), filetypes=ftypes))
+
+        self.datafiles_Label.configure(
+            text="\n".join(os.path.basename(bob) for bob in self.datafiles)
+        )
+        self.compare_button.configure(state="normal" if self.datafiles else "disabled")
+
+    def on_open_meta(self):
+        ftypes = [("Excel files", "*.xlsx"), ("All files", "*")]
+        self.metadatafiles = tuple(askopenfilenames(initialdir=os.getcwd(), filetypes=ftypes))
+
+        self.metadatafiles_Label.configure(
+            text="\n".join(os.path.basename(bob) for bob in self.metadatafiles)
+        )
+
+    def on_compare(self):
+        min_depth = float(self.mindepth.get()) if self.mindepth.get() else -np.inf
+        max_depth = float(self.maxdepth.get()) if self.maxdepth.get() else np.inf
+
+        alice = self.alice
+
+        dic = Dic(cores=alice.cores, metadata=alice.metadata, tiepoints=alice.tiepoints)
+
+        self.update = None
+        self.compare_button.configure(state="disabled")
+        self.apply_button.configure(state="disabled")
+
+        # the files are parsed and compared in a background thread
+        progress: "queue.Queue[tuple[str, int, int]]" = queue.Queue()
+        outcome: dict[str, Any] = {}
+
+        def compare():
+            try:
+                cores, metadata = parse_files(
+                    self.datafiles,
+                    self.metadatafiles,
+                    min_depth,
+                    max_depth,
+                    workers=os.cpu_count() or 1,
+                    progress=lambda *bob: progress.put(bob),
+                    sheet_cache=SheetCache(),
+                )
+                outcome["update"] = DataUpdate(dic, cores, metadata)
+            except Exception as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=compare, name="alice-update", daemon=True)
+        thread.start()
+
+        self.poll(thread, progress, outcome)
+
+    def poll(
+        self,
+        thread: threading.Thread,
+        progress: "queue.Queue[tuple[str, int, int]]",
+        outcome: dict[str, Any],
+    ):
+        # the dialog was closed while comparing
+        if not self.top.winfo_exists():
+            return
+
+        while not progress.empty():
+            datafile, done, total = progress.get()
+            self.show(f"{done}/{total} files read ({os.path.basename(datafile)})")
+
+        if thread.is_alive():
+            self.top.after(100, self.poll, thread, progress, outcome)
+            return
+
+        self.compare_button.configure(state="normal")
+
+        if "error" in outcome:
+            self.show(f"failed: {outcome['error']}")
+            return
+
+        self.update = outcome["update"]
+        assert self.update is not None
+
+        self.show(self.update.summary())
+
+        if not self.update.empty:
+            self.apply_button.configure(state="normal")
+
+    def on_apply(self):
+        assert self.update is not None
+
+        alice = self.alice
+
+        # the journal must be complete before the file is written,
+        # the tiepoints written with the cores then replace it
+        saveState(alice)()
+        alice.autosave.flush()
+        alice.journal.take()
+
+        self.update.apply()
+        write_cores(self.update.dic, alice.filename, self.update.modified)
+
+        alice.StartApp()
+
+        self.top.destroy()
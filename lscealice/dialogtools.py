@@ -1,42 +1,54 @@
 import os
 from tkinter.filedialog import asksaveasfilename
 
-import pandas as pd
-
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .ALICE import ALICE
 
-from .export import load_alig_array
-from .dic import Dic, load_dic_file, write_dic_file
+from .export import write_alig_file
+from .dic import Dic, write_dic_file, write_tiepoints
+from .journal import journal_path
 
 
-def tkinter_export_to_csv(out: pd.DataFrame):
+def tkinter_export(filename: str, species: Optional[str], mode: str = "linear"):
     workdir = os.getcwd()
 
-    ftypes = [("CSV files", "*.csv"), ("All files", "*")]
+    # the format is given by the extension (see write_alig_file)
+    ftypes = [
+        ("CSV files", "*.csv"),
+        ("Numpy archives", "*.npz"),
+    ]
 
-    csvfilename = asksaveasfilename(
+    exportfilename = asksaveasfilename(
         initialdir=workdir,
         initialfile="Untitled.csv",
         defaultextension=".csv",
         filetypes=ftypes,
     )
 
-    if csvfilename:
-        out.to_csv(csvfilename, index=True)
+    if exportfilename:
+        # streamed to the file, the aligned table is never built in memory
+        write_alig_file(filename, exportfilename, species=species, mode=mode)
+
+
+def export_to_csv(filename: str, species_on_display: str, mode: str = "linear"):
+    tkinter_export(filename, species_on_display, mode)
 
 
-def export_to_csv(filename: str, species_on_display: str):
-    out = load_alig_array(filename, species_on_display)
-    tkinter_export_to_csv(out)
+def export_all_to_csv(filename: str, mode: str = "linear"):
+    # every species and every profile, with (species, profile) columns
+    tkinter_export(filename, None, mode)
 
 
 def tkinter_saveStateAs(out: Dic):
     workdir = os.getcwd()
 
-    ftypes = [("Pickle files", "*.pkl"), ("All files", "*")]
+    ftypes = [
+        ("Pickle files", "*.pkl"),
+        ("Columnar ALICE files", "*.alice"),
+        ("All files", "*"),
+    ]
 
     pklfilename = asksaveasfilename(
         initialdir=workdir,
@@ -45,8 +57,8 @@ def tkinter_saveStateAs(out: Dic):
         filetypes=ftypes,
     )
 
-    if pklfilename is None:  # type: ignore
-        # asksaveasfile return `None` if dialog closed with "cancel".
+    if not pklfilename:  # type: ignore
+        # asksaveasfile return `None` or "" if dialog closed with "cancel".
         return
 
     write_dic_file(out, pklfilename)
@@ -65,16 +77,41 @@ def saveStateAs(alice: 'ALICE'):
         newfilename = tkinter_saveStateAs(new_dic)
         if newfilename is not None:
             alice.filename = newfilename
+            # the new file already holds every tiepoint
+            alice.journal.take()
 
     return dialog
 
 
 def saveState(alice: 'ALICE'):
     def writer():
-        new_dic = load_dic_file(alice.filename)
+        # only append the tiepoint operations made since the last save
+        # to the journal, the alignment file itself is left untouched.
+        # The append happens in the autosave thread.
+        alice.autosave.submit(alice.filename, alice.journal.take())
+
+    return writer
+
+
+def compactState(alice: 'ALICE'):
+    def writer():
+        # the journal must be complete before it is folded in the file
+        saveState(alice)()
+        alice.autosave.flush()
+
+        pending = alice.journal.take()
 
-        new_dic["tiepoints"] = alice.tiepoints.copy()
+        if not pending and not os.path.isfile(journal_path(alice.filename)):
+            # nothing to fold back into the alignment file
+            return
+
+        new_dic = Dic(
+            tiepoints=alice.tiepoints,
+            cores=alice.cores,
+            metadata=alice.metadata,
+        )
 
-        write_dic_file(new_dic, alice.filename)
+        # also takes care of removing the journal
+        write_tiepoints(new_dic, alice.filename)
 
     return writer
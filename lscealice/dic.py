@@ -1,11 +1,24 @@
-from typing import Any, TypedDict, cast, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Optional, TypedDict, cast, Iterable
 from pickle import dump, load
+import multiprocessing
+import os
 
 import numpy as np
 from numpy.typing import NDArray
-import pandas as pd
 
-from .excel import read
+from .excel import read_workbook
+from .sheetcache import SheetCache
+from .widecsv import is_csv_file, read_wide_csv
+from .tiepoints import Tiepoint, TiepointStore, as_tiepoint_stores
+from .journal import read_records, replay_records, discard_journal
+from .columnar import (
+    is_columnar_file,
+    load_columnar_file,
+    write_columnar_file,
+    append_columnar_tiepoints,
+    append_columnar_cores,
+)
 
 Entry = Any  # TODO
 
@@ -15,26 +28,220 @@ class Cores(TypedDict):
     depth: NDArray[np.float64]
 
 
-class Tiepoint(TypedDict):
-    profile_depth: float
-    ref_depth: float
-    species: str
-
-
 class Dic(TypedDict):
     cores: dict[str, dict[str, Cores]]
     metadata: Entry
-    tiepoints: dict[str, list[Tiepoint]]
+    tiepoints: dict[str, TiepointStore]
+
+
+# alignment files with this extension are written in the columnar format,
+# any other file is written as a pickle (legacy format)
+COLUMNAR_EXTENSION = ".alice"
 
 
 def load_dic_file(filename: str):
-    with open(filename, "rb") as fp:
-        return cast(Dic, load(fp))
+    if is_columnar_file(filename):
+        # core arrays are memory mapped and only read when used
+        dic = load_columnar_file(filename)
+    else:
+        with open(filename, "rb") as fp:
+            dic = cast(Dic, load(fp))
+
+    # older files hold lists of Tiepoint dicts
+    dic["tiepoints"] = as_tiepoint_stores(dic["tiepoints"])
+
+    # tiepoints edited since the last full save are kept in the journal
+    replay_records(dic["tiepoints"], read_records(filename))
+
+    return dic
 
 
 def write_dic_file(dic: Dic, filename: str):
-    with open(filename, "wb") as fp:
-        dump(dic, fp)
+    if filename.endswith(COLUMNAR_EXTENSION):
+        write_columnar_file(dic, filename)
+
+    else:
+        # write to a temporary file first so that an interrupted save
+        # never leaves a half written alignment file behind
+        tmpfilename = filename + ".tmp"
+
+        with open(tmpfilename, "wb") as fp:
+            dump(dic, fp)
+
+        os.replace(tmpfilename, filename)
+
+    # the file now holds all the tiepoints, the journal is obsolete
+    discard_journal(filename)
+
+
+def write_tiepoints(dic: Dic, filename: str):
+    # save the tiepoints of dic to filename, which already holds
+    # the same cores and metadata
+
+    if is_columnar_file(filename):
+        # no need to rewrite the cores arrays
+        append_columnar_tiepoints(filename, dic["tiepoints"])
+        discard_journal(filename)
+
+    else:
+        write_dic_file(dic, filename)
+
+
+def write_cores(dic: Dic, filename: str, changed: Iterable[tuple[str, str]]):
+    # save dic to filename, which already holds the same cores
+    # but for the changed (profile, species) ones
+
+    if is_columnar_file(filename):
+        # only the changed arrays are written
+        append_columnar_cores(filename, dic, changed)
+        discard_journal(filename)
+
+    else:
+        write_dic_file(dic, filename)
+
+
+def convert_dic_file(filename: str, newfilename: str):
+    # the format of the new file is given by its extension, e.g.
+    # convert_dic_file("campaign.pkl", "campaign.alice") or the other way round
+    write_dic_file(load_dic_file(filename), newfilename)
+
+
+def _read_workbook(datafile: str, sheet_cache: Optional[SheetCache]):
+    if sheet_cache is None:
+        return read_workbook(datafile)
+
+    return sheet_cache.read_workbook(datafile)
+
+
+def parse_datafile(
+    datafile: str,
+    min_depth: float,
+    max_depth: float,
+    sheet_cache: Optional[SheetCache] = None,
+):
+    # cores of every sheet (one profile per sheet) of a data file
+    if is_csv_file(datafile):
+        # wide tables are streamed, they are not cached
+        return read_wide_csv(datafile, min_depth, max_depth)
+
+    cores: dict[str, dict[str, Cores]] = {}
+
+    for lab, df in _read_workbook(datafile, sheet_cache).items():
+        dfnp = df.to_numpy()  # type: ignore
+        ## todo later: adjust the code for then sample_date is not defined
+        # sample_date = datetime.date(2000,1,1) # just a random date for now
+
+        core_depth = dfnp[1:, 0].astype(None)
+
+        # for Agnese in july 2024: restrict to the first 18 meters
+        ind = np.logical_and(core_depth > min_depth, core_depth < max_depth)
+
+        core_dic = cores.setdefault(lab, {})
+
+        for i in range(1, len(df.T)):
+            chem_name: str = dfnp[0, i]
+            chem_profile = dfnp[1:, i].astype(None)
+
+            core_dic[chem_name] = Cores(
+                data=chem_profile[ind].copy(),
+                depth=core_depth[ind].copy(),
+            )
+
+    return cores
+
+
+def parse_metadatafile(datafile: str, sheet_cache: Optional[SheetCache] = None):
+    # metadata of every sheet (one profile per sheet) of a metadata file:
+    # names on the first row and values on the second
+    metadata: dict[str, Entry] = {}
+
+    for lab, df in _read_workbook(datafile, sheet_cache).items():
+        entry = metadata.setdefault(lab, {})
+
+        for i in range(0, len(df.T)):
+            entry[df.iloc[0, i]] = df.iloc[1, i]
+
+    return metadata
+
+
+def _parse_task(
+    kind: str,
+    datafile: str,
+    min_depth: float,
+    max_depth: float,
+    sheet_cache: Optional[SheetCache],
+):
+    if kind == "data":
+        return parse_datafile(datafile, min_depth, max_depth, sheet_cache)
+
+    return parse_metadatafile(datafile, sheet_cache)
+
+
+# called with the file just parsed, the number of files parsed and the total
+IngestProgress = Callable[[str, int, int], None]
+
+
+def parse_files(
+    datafiles: Iterable[str],
+    metadatafiles: Iterable[str],
+    min_depth: float,
+    max_depth: float,
+    workers: int = 1,
+    progress: Optional[IngestProgress] = None,
+    sheet_cache: Optional[SheetCache] = None,
+):
+    # cores and metadata of the profiles of the data and metadata files.
+    # Each workbook is parsed once, all its sheets together.
+    # With workers > 1 the files are parsed in a pool of processes;
+    # the result does not depend on the order they complete in.
+    # With a sheet_cache, unchanged workbooks are not parsed again
+    # (e.g. when only the depth window or the reference changes).
+    tasks = [("data", datafile) for datafile in datafiles]
+    tasks += [("metadata", datafile) for datafile in metadatafiles]
+
+    results: list[Any] = [None] * len(tasks)
+
+    def done(k: int, result: Any):
+        results[k] = result
+
+        if progress is not None:
+            progress(tasks[k][1], sum(bob is not None for bob in results), len(tasks))
+
+    if workers > 1 and len(tasks) > 1:
+        # the gui parses from a thread while others run (autosave, prefetch):
+        # forking it could leave a lock held in the workers, they are spawned
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _parse_task, kind, datafile, min_depth, max_depth, sheet_cache
+                ): k
+                for k, (kind, datafile) in enumerate(tasks)
+            }
+
+            for future in as_completed(futures):
+                done(futures[future], future.result())
+    else:
+        for k, (kind, datafile) in enumerate(tasks):
+            done(k, _parse_task(kind, datafile, min_depth, max_depth, sheet_cache))
+
+    cores: dict[str, dict[str, Cores]] = {}
+    metadata: dict[str, Entry] = {}
+
+    # merged in the order of the files, later files win as before
+    for (kind, _datafile), result in zip(tasks, results):
+        if kind == "data":
+            for lab, core_dic in result.items():
+                print(lab)
+                cores.setdefault(lab, {}).update(core_dic)
+
+        else:
+            for lab, entry in result.items():
+                metadata.setdefault(lab, {}).update(entry)
+
+    return cores, metadata
 
 
 def initAlignmentFile(
@@ -43,60 +250,20 @@ def initAlignmentFile(
     ref_lab: str,
     min_depth: float,
     max_depth: float,
+    workers: int = 1,
+    progress: Optional[IngestProgress] = None,
+    sheet_cache: Optional[SheetCache] = None,
 ):
-    new_dic = Dic(
-        cores={},
-        metadata={},
-        tiepoints={},
+    cores, metadata = parse_files(
+        datafiles, metadatafiles, min_depth, max_depth, workers, progress, sheet_cache
     )
 
-    for datafile in datafiles:
-        xls = pd.ExcelFile(datafile)
-        core_names = map(str, xls.sheet_names[:])
-        for i, lab in enumerate(core_names):
-            df = read(datafile, i)
-            dfnp = df.to_numpy()  # type: ignore
-            ## todo later: adjust the code for then sample_date is not defined
-            # sample_date = datetime.date(2000,1,1) # just a random date for now
-
-            print(lab)
-            core_depth = dfnp[1:, 0].astype(None)
-
-            if lab not in new_dic["tiepoints"].keys():
-                # initialize tiepoints with empty lists
-                new_dic["tiepoints"][lab] = []
-
-            if lab not in new_dic["cores"].keys():
-                new_dic["cores"][lab] = {}
-
-            for i in range(1, len(df.T)):
-                chem_name: str = dfnp[0, i]
-                chem_profile = dfnp[1:, i].astype(None)
-
-                # for Agnese in july 2024: restrict to the first 18 meters
-                ind = np.logical_and(core_depth > min_depth, core_depth < max_depth)
-
-                new_dic["cores"][lab][chem_name] = Cores(
-                    data=chem_profile[ind].copy(),
-                    depth=core_depth[ind].copy(),
-                )
-
-    for datafile in metadatafiles:
-        xls = pd.ExcelFile(datafile)
-        core_names = map(str, xls.sheet_names[:])
-        for i, lab in enumerate(core_names):
-            df = read(datafile, i)
-            if lab not in new_dic["metadata"].keys():
-                # initialize tiepoints with empty lists
-                new_dic["metadata"][lab] = {}
-            for i in range(0, len(df.T)):
-                # metadata_name = df.to_numpy()[0,i]
-                metadata_name = df.iloc[0, i]
-
-                # metadata_value = df.to_numpy()[1,i]
-                metadata_value = df.iloc[1, i]
-
-                new_dic["metadata"][lab][metadata_name] = metadata_value
+    new_dic = Dic(
+        cores=cores,
+        metadata=metadata,
+        # initialize tiepoints with empty stores
+        tiepoints={lab: TiepointStore() for lab in cores.keys()},
+    )
 
     new_dic["cores"]["REF"] = new_dic["cores"][ref_lab].copy()
 
@@ -0,0 +1,44 @@
+from typing import Any, Optional
+
+from matplotlib.artist import Artist
+from matplotlib.backend_bases import Event
+from matplotlib.figure import Figure
+
+
+class BlitManager:
+    # draws a few animated artists (hover highlight, selection marker, ...)
+    # over a copy of the figure taken after its last full draw,
+    # so that moving them does not redraw the lines underneath.
+    # After the next full draw (draw_idle) the background is taken again.
+
+    def __init__(self, fig: Figure, artists: list[Artist]):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.artists = artists
+
+        self.background: Optional[Any] = None
+
+        # animated artists are skipped by the full draws
+        for artist in artists:
+            artist.set_animated(True)
+
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def on_draw(self, _event: Optional[Event]):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)  # type: ignore
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artists:
+            if artist.get_visible():
+                self.fig.draw_artist(artist)
+
+    def update(self):
+        if self.background is None:
+            # not drawn yet, the draw event will draw the artists
+            self.canvas.draw_idle()
+            return
+
+        self.canvas.restore_region(self.background)  # type: ignore
+        self.draw_artists()
+        self.canvas.blit(self.fig.bbox)
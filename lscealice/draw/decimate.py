@@ -0,0 +1,153 @@
+from typing import Optional
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from matplotlib.axes import Axes
+from matplotlib.lines import Line2D
+
+
+# blocks drawn for each pixel of the axes width, each block gives two vertices
+BLOCKS_PER_PIXEL = 2
+
+
+def _reduce(
+    signal: NDArray[np.float64], indices: NDArray[np.intp], smaller: bool
+) -> NDArray[np.intp]:
+    # index of the min (or max) of each pair of consecutive indices,
+    # the values which are not NaN are preferred
+    m = len(indices) // 2 * 2
+
+    a = indices[0:m:2]
+    b = indices[1:m:2]
+
+    va = signal[a]
+    vb = signal[b]
+
+    pick_b = ((vb < va) if smaller else (vb > va)) | np.isnan(va)
+
+    return np.concatenate((np.where(pick_b, b, a), indices[m:]))
+
+
+class MinMaxPyramid:
+    # multi-resolution min/max envelopes of a profile, to draw it with
+    # a number of vertices matched to the width of the view in pixels.
+    # Level k keeps, for each block of 2**k samples, the indices of its
+    # minimum and maximum, so that peaks stay visible at every zoom level.
+
+    def __init__(self, depth: ArrayLike, signal: ArrayLike):
+        depth = np.asarray(depth, dtype=np.float64)
+        signal = np.asarray(signal, dtype=np.float64)
+
+        if np.any(depth[1:] < depth[:-1]):
+            order = np.argsort(depth, kind="stable")
+            depth = depth[order]
+            signal = signal[order]
+
+        self.depth = depth
+        self.signal = signal
+
+        self.levels: list[tuple[NDArray[np.intp], NDArray[np.intp]]] = []
+
+        lo = hi = np.arange(len(signal))
+        while len(lo) > 1:
+            lo = _reduce(signal, lo, smaller=True)
+            hi = _reduce(signal, hi, smaller=False)
+            self.levels.append((lo, hi))
+
+    def __len__(self):
+        return len(self.depth)
+
+    @property
+    def nbytes(self):
+        return (
+            self.depth.nbytes
+            + self.signal.nbytes
+            + sum(lo.nbytes + hi.nbytes for lo, hi in self.levels)
+        )
+
+    def range_minmax(self, i0: int, i1: int) -> tuple[float, float]:
+        # min and max of signal[i0:i1] (ignoring NaN), combined from at most
+        # two blocks per level as in a segment tree: O(log n), no scan
+        lo_candidates: list[int] = []
+        hi_candidates: list[int] = []
+
+        def take(level: int, block: int):
+            if level == 0:
+                lo_candidates.append(block)
+                hi_candidates.append(block)
+            else:
+                lo, hi = self.levels[level - 1]
+                lo_candidates.append(int(lo[block]))
+                hi_candidates.append(int(hi[block]))
+
+        level = 0
+        while i0 < i1:
+            if i0 & 1:
+                take(level, i0)
+                i0 += 1
+            if i1 & 1:
+                i1 -= 1
+                take(level, i1)
+
+            i0 >>= 1
+            i1 >>= 1
+            level += 1
+
+        if not lo_candidates:
+            return np.nan, np.nan
+
+        return (
+            float(np.fmin.reduce(self.signal[lo_candidates])),
+            float(np.fmax.reduce(self.signal[hi_candidates])),
+        )
+
+    def minmax(self, xmin: Optional[float] = None, xmax: Optional[float] = None):
+        # min and max of the signal between depths xmin and xmax
+        # (the whole profile by default)
+        i0 = 0 if xmin is None else int(np.searchsorted(self.depth, xmin, side="left"))
+        i1 = len(self.depth) if xmax is None else int(np.searchsorted(self.depth, xmax, side="right"))
+
+        return self.range_minmax(i0, i1)
+
+    def query(self, xmin: float, xmax: float, blocks: int):
+        # depth and signal of the vertices to draw between xmin and xmax
+        # (and one more sample on each side), with at most about `blocks`
+        # min/max pairs
+        n = len(self.depth)
+
+        i0 = max(int(np.searchsorted(self.depth, xmin, side="left")) - 1, 0)
+        i1 = min(int(np.searchsorted(self.depth, xmax, side="right")) + 1, n)
+
+        level = 0
+        while (i1 - i0) >> level > blocks and level < len(self.levels):
+            level += 1
+
+        if level == 0:
+            return self.depth[i0:i1], self.signal[i0:i1]
+
+        lo, hi = self.levels[level - 1]
+
+        b0 = i0 >> level
+        b1 = min(((i1 - 1) >> level) + 1, len(lo))
+
+        # the min and max of each block, in depth order,
+        # between the first and last samples of the range
+        indices = np.empty(2 * (b1 - b0) + 2, dtype=np.intp)
+        indices[1:-1:2] = np.minimum(lo[b0:b1], hi[b0:b1])
+        indices[2:-1:2] = np.maximum(lo[b0:b1], hi[b0:b1])
+        indices[0] = i0
+        indices[-1] = i1 - 1
+
+        # the first and last blocks may start before i0 or end after i1
+        np.clip(indices, i0, i1 - 1, out=indices)
+
+        return self.depth[indices], self.signal[indices]
+
+
+def set_decimated_data(line: Line2D, pyramid: MinMaxPyramid, ax: Axes):
+    # draw the part of the profile in the current x limits of ax
+    xmin, xmax = sorted(ax.get_xlim())
+    blocks = max(1, int(ax.bbox.width * BLOCKS_PER_PIXEL))
+
+    line.set_data(*pyramid.query(xmin, xmax, blocks))
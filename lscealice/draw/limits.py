@@ -1,7 +1,7 @@
 import numpy as np
 from numpy.typing import NDArray
 
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from ..ALICE import ALICE
@@ -105,38 +105,43 @@ def update_base_xlims(alice: 'ALICE'):
     alice.ax3.set_xlim(float(np.nanmin(depth2)), float(np.nanmax(depth2)))
 
 
-def update_base_ylims(alice: 'ALICE'):
-    # TO IMPLEMENT:
-    # USE THE MAX OF THE CURRENT VIEW, NOT THE MAX OF THE ENTIRE PROFILE!!!
+def compute_ylim(ymin: float, ymax: float):
+    rangey = np.abs(ymax - ymin)
 
-    # date1 = alice.cores[alice.profile_on_display]['time']
-    # date2 = alice.cores['REF']['time']
+    return (float(ymin - rangey / 20), float(ymax + rangey / 20))
 
-    _depth1, signal1, _depth2, signal2 = alice.get_linedata()
 
-    rangey1 = np.abs(np.nanmax(signal1) - np.nanmin(signal1))
-    rangey2 = np.abs(np.nanmax(signal2) - np.nanmin(signal2))
+def update_base_ylims(
+    alice: 'ALICE',
+    xlim1: Optional[tuple[float, float]] = None,
+    xlim2: Optional[tuple[float, float]] = None,
+):
+    # y limits of the 100% view from the min and max of the signals
+    # in the x limits xlim1 and xlim2 of ax1 and ax2 (the current view),
+    # or of the entire profiles by default (which also sets the preview).
+    # The min and max are read from the decimation pyramids of the profiles,
+    # there is no scan of the signals.
 
-    ylim1 = (
-        float(np.nanmin(signal1) - rangey1 / 20),
-        float(np.nanmax(signal1) + rangey1 / 20),
-    )
-    ylim2 = (
-        float(np.nanmin(signal2) - rangey2 / 20),
-        float(np.nanmax(signal2) + rangey2 / 20),
-    )
+    # date1 = alice.cores[alice.profile_on_display]['time']
+    # date2 = alice.cores['REF']['time']
+
+    ylim1 = compute_ylim(*alice.pyramid1.minmax(*sorted(xlim1) if xlim1 else ()))
+    ylim2 = compute_ylim(*alice.pyramid2.minmax(*sorted(xlim2) if xlim2 else ()))
 
     ylim = (
         float(np.nanmin(np.array([ylim1[0], ylim2[0]]))),
         float(np.nanmax(np.array([ylim1[1], ylim2[1]]))),
     )
 
-    if np.isfinite(ylim[0]):
-        if alice.minmaxscaling_BooleanVar.get() is True:
+    # an axis whose window holds no samples keeps its limits
+    if alice.minmaxscaling_BooleanVar.get() is True:
+        if np.isfinite(ylim1[0]):
             alice.base_ylim1 = ylim1
+        if np.isfinite(ylim2[0]):
             alice.base_ylim2 = ylim2
-        else:
-            alice.base_ylim1 = ylim
-            alice.base_ylim2 = ylim
+    elif np.isfinite(ylim[0]):
+        alice.base_ylim1 = ylim
+        alice.base_ylim2 = ylim
 
-    alice.ax3.set_ylim(alice.base_ylim2)
+    if xlim1 is None and xlim2 is None:
+        alice.ax3.set_ylim(alice.base_ylim2)
@@ -0,0 +1,106 @@
+import time
+
+from collections import deque
+from typing import Any, Optional
+
+from matplotlib.figure import Figure
+
+from .blit import BlitManager
+
+
+# minimum time between two frames
+FRAME_INTERVAL = 1 / 60
+
+# draw durations kept per canvas
+TIMINGS_LENGTH = 100
+
+
+class RedrawScheduler:
+    # the single place where the figures are drawn.
+    # Callers mark a canvas as stale (for a full draw, or only for blitting
+    # its animated artists) and the requests made during a burst of callbacks
+    # are coalesced: each canvas is drawn at most once per frame, from the
+    # tkinter event loop (after_idle, or a timer to keep FRAME_INTERVAL
+    # between frames).
+
+    def __init__(self, widget: Any):
+        # widget gives access to the tkinter event loop (after, after_idle)
+        self.widget = widget
+
+        self.figures: dict[str, Figure] = {}
+        self.blit_managers: dict[str, Optional[BlitManager]] = {}
+
+        self.stale_draw: set[str] = set()
+        self.stale_blit: set[str] = set()
+
+        self.scheduled = False
+        self.last_frame = 0.0
+
+        # durations of the last draws of each canvas, in seconds
+        self.timings: dict[str, deque[float]] = {}
+
+    def register(self, name: str, fig: Figure, blit_manager: Optional[BlitManager] = None):
+        self.figures[name] = fig
+        self.blit_managers[name] = blit_manager
+        self.timings[name] = deque(maxlen=TIMINGS_LENGTH)
+
+    def unregister(self, name: str):
+        for registry in (self.figures, self.blit_managers, self.timings):
+            registry.pop(name, None)
+
+        self.stale_draw.discard(name)
+        self.stale_blit.discard(name)
+
+    def mark_stale(self, name: str, blit: bool = False):
+        # blit=True when only the animated artists of the canvas changed
+        if blit and self.blit_managers[name] is not None:
+            self.stale_blit.add(name)
+        else:
+            self.stale_draw.add(name)
+
+        self.schedule()
+
+    def schedule(self):
+        if self.scheduled:
+            return
+
+        self.scheduled = True
+
+        delay = self.last_frame + FRAME_INTERVAL - time.perf_counter()
+
+        if delay <= 0:
+            self.widget.after_idle(self.flush)
+        else:
+            self.widget.after(max(1, int(delay * 1000)), self.flush)
+
+    def flush(self):
+        self.scheduled = False
+        self.last_frame = time.perf_counter()
+
+        stale_draw, self.stale_draw = self.stale_draw, set()
+        stale_blit, self.stale_blit = self.stale_blit, set()
+
+        for name in stale_draw:
+            start = time.perf_counter()
+            self.figures[name].canvas.draw()
+            self.timings[name].append(time.perf_counter() - start)
+
+        # a full draw already drew the animated artists
+        for name in stale_blit - stale_draw:
+            blit_manager = self.blit_managers[name]
+            assert blit_manager is not None
+
+            start = time.perf_counter()
+            blit_manager.update()
+            self.timings[name].append(time.perf_counter() - start)
+
+    def timing_summary(self):
+        # number of draws, mean and max duration (ms) of the recent draws of each canvas
+        return {
+            name: (
+                len(timings),
+                1000 * sum(timings) / len(timings) if timings else 0.0,
+                1000 * max(timings, default=0.0),
+            )
+            for name, timings in self.timings.items()
+        }
@@ -1,12 +1,11 @@
 import pandas as pd
-import numpy as np
 
 
-def read(io: str, sheet_name: int):
-    df = pd.read_excel(  # type: ignore
-        io, sheet_name=sheet_name, skiprows=0, header=None
+def read_workbook(io: str) -> dict[str, pd.DataFrame]:
+    # every sheet of the workbook by name, in the order of the workbook,
+    # parsed in a single pass over the file ("n.a." cells are missing values)
+    sheets = pd.read_excel(  # type: ignore
+        io, sheet_name=None, skiprows=0, header=None, na_values=["n.a."]
     )
 
-    return df.replace(  # type: ignore
-        "n.a.", np.nan
-    )
+    return {str(name): df for name, df in sheets.items()}
@@ -1,11 +1,214 @@
-from typing import Optional, Iterable
+import multiprocessing
+import os
+import re
+import tempfile
+import zipfile
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Iterable, Iterator, Union
 
 import numpy as np
 from numpy.typing import NDArray
 import pandas as pd
 
-from .load import load_profiles_data, load_marked_points
-from .utils import depth_sqz_str
+from .dic import Cores
+from .load import AligFile, open_alig_file
+from .mapping import TiepointMapping
+
+
+def align_profile(
+    profile_dic: dict[str, Cores],
+    mapping: TiepointMapping,
+    species_list: Iterable[str],
+    x_dic: dict[str, NDArray[np.float64]],
+) -> dict[str, Optional[NDArray[np.float64]]]:
+    # interpolate the species of one profile on the reference depths x_dic[species]
+    # (None for species missing in the profile).
+
+    # the mapped depths only depend on the profile depth scale, which is
+    # usually shared by all the species of a profile: they are only recomputed
+    # when the depth scale changes from one species to the next
+    depth1: Optional[NDArray[np.float64]] = None
+    depth_new: NDArray[np.float64] = np.empty(0)
+
+    out: dict[str, Optional[NDArray[np.float64]]] = {}
+
+    for species in species_list:
+        if species not in profile_dic:
+            out[species] = None
+            continue
+
+        depth = profile_dic[species]["depth"]
+
+        if depth1 is None or not (depth is depth1 or np.array_equal(depth, depth1)):
+            depth1 = depth
+            depth_new = mapping(depth1)
+
+        out[species] = mapping.resample(
+            depth1, profile_dic[species]["data"], x_dic[species], depth_new
+        )
+
+    return out
+
+
+def align_labelled_profile(
+    alig: AligFile,
+    profile: str,
+    species_list: Iterable[str],
+    x_dic: dict[str, NDArray[np.float64]],
+    mode: str = "linear",
+):
+    _ref_dic, cores_dic = alig.profiles_data
+
+    mappings = alig.get_mappings(mode)
+
+    if profile not in mappings.keys():
+        return dict.fromkeys(species_list)
+
+    return align_profile(cores_dic[profile], mappings[profile], species_list, x_dic)
+
+
+# state of the export worker processes, set once per process by _init_worker
+_worker_args: tuple[Any, ...] = ()
+
+
+def _init_worker(
+    aligfile: str,
+    species_list: list[str],
+    x_dic: dict[str, NDArray[np.float64]],
+    mode: str,
+):
+    global _worker_args
+
+    # each worker opens the file once: columnar files are memory mapped
+    # (so the cores arrays are shared through the page cache), while a
+    # legacy .pkl file is loaded whole again in every worker process.
+    # Tasks then only carry a profile name.
+    # Workers are spawned, not forked: the gui may export from a thread.
+    _worker_args = (open_alig_file(aligfile), species_list, x_dic, mode)
+
+
+def _align_profile_task(profile: str):
+    alig, species_list, x_dic, mode = _worker_args
+
+    return align_labelled_profile(alig, profile, species_list, x_dic, mode)
+
+
+def common_vertical_scale(
+    ref_dic: dict[str, Cores],
+    species_list: list[str],
+    vertical_scale: Optional[NDArray[np.float64]] = None,
+) -> NDArray[np.float64]:
+    if vertical_scale is not None:
+        return vertical_scale
+
+    if not species_list:
+        return np.empty(0)
+
+    if len(species_list) == 1:
+        return ref_dic[species_list[0]]["depth"].copy()
+
+    # all the depths of the reference for these species
+    return np.unique(np.concatenate([ref_dic[bob]["depth"] for bob in species_list]))
+
+
+def load_alig_arrays(
+    aligfile: str,
+    species: Optional[Iterable[str]] = None,
+    vertical_scale: Optional[NDArray[np.float64]] = None,
+    labels: Optional[Iterable[str]] = None,
+    tidy: bool = False,
+    workers: int = 1,
+    mode: str = "linear",
+) -> pd.DataFrame:
+    # aligned data of every species x profile in one pass.
+    #
+    # By default (tidy=False) returns a DataFrame with (species, profile)
+    # columns, indexed by vertical_scale or else by all the depths of the
+    # reference for the species exported.
+    # With tidy=True returns a long table with species, profile, depth and value
+    # columns, where each species uses its own reference depths unless
+    # vertical_scale is given, and missing values are dropped.
+    #
+    # With workers > 1 the profiles are aligned in a pool of processes,
+    # the result is the same as with the default serial path. Each worker
+    # loads a legacy .pkl file whole, workers pay off with .alice files.
+    #
+    # mode selects the depth mapping between tiepoints (see TiepointMapping).
+
+    alig = open_alig_file(aligfile)
+
+    ref_dic, cores_dic = alig.profiles_data
+
+    species_list = list(ref_dic.keys()) if species is None else list(species)
+
+    labels = list(cores_dic.keys() if labels is None else labels)
+
+    if tidy and vertical_scale is None:
+        x_dic = {bob: ref_dic[bob]["depth"] for bob in species_list}
+    else:
+        x = common_vertical_scale(ref_dic, species_list, vertical_scale)
+        x_dic = {bob: x for bob in species_list}
+
+    if workers > 1 and len(labels) > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(aligfile, species_list, x_dic, mode),
+        ) as executor:
+            # map yields the results in the order of labels
+            aligned_profiles = list(
+                executor.map(
+                    _align_profile_task,
+                    labels,
+                    chunksize=max(1, len(labels) // (4 * workers)),
+                )
+            )
+    else:
+        aligned_profiles = [
+            align_labelled_profile(alig, profile, species_list, x_dic, mode)
+            for profile in labels
+        ]
+
+    out: dict[tuple[str, str], NDArray[np.float64]] = {}
+
+    for profile, aligned in zip(labels, aligned_profiles):
+        for bob in species_list:
+            signal_new = aligned[bob]
+
+            if signal_new is None:
+                print("missing data or tiepoints for ", profile, bob)
+                signal_new = np.full(len(x_dic[bob]), np.nan)
+
+            out[(bob, profile)] = signal_new
+
+    # species major column order
+    out = {(bob, profile): out[(bob, profile)] for bob in species_list for profile in labels}
+
+    if not tidy:
+        columns = pd.MultiIndex.from_tuples(out.keys())
+        x = x_dic[species_list[0]] if species_list else np.empty(0)
+        return pd.DataFrame(dict(zip(columns, out.values())), index=x, columns=columns)
+
+    frames = []
+    for (bob, profile), signal_new in out.items():
+        keep = ~np.isnan(signal_new)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "species": bob,
+                    "profile": profile,
+                    "depth": x_dic[bob][keep],
+                    "value": signal_new[keep],
+                }
+            )
+        )
+
+    if not frames:
+        return pd.DataFrame(columns=["species", "profile", "depth", "value"])
+
+    return pd.concat(frames, ignore_index=True)
 
 
 def load_alig_array(
@@ -13,46 +216,177 @@ def load_alig_array(
     species: str,
     vertical_scale: Optional[NDArray[np.float64]] = None,
     labels: Optional[Iterable[str]] = None,
+    workers: int = 1,
+    mode: str = "linear",
 ) -> pd.DataFrame:
-    # create an array with
-
-    ref_dic, cores_dic = load_profiles_data(aligfile)
+    # create an array with the aligned profiles of species,
+    # on the reference depths unless vertical_scale is given
 
-    xp1_dic, xp2_dic = load_marked_points(aligfile)
+    ref_dic, _cores_dic = open_alig_file(aligfile).profiles_data
 
     x: NDArray[np.float64] = (
         ref_dic[species]["depth"].copy() if vertical_scale is None else vertical_scale
     )
 
-    if labels is None:
-        labels = cores_dic.keys()
+    out = load_alig_arrays(aligfile, [species], x, labels, workers=workers, mode=mode)
+
+    return pd.DataFrame(
+        data={profile: out[(bob, profile)].to_numpy() for bob, profile in out.columns},
+        index=x,
+    )
+
+
+# memory used by the streaming csv export for each chunk of rows
+EXPORT_MEMORY_BUDGET = 64 * 2**20
+
+
+def iter_alig_columns(
+    aligfile: str,
+    species: Union[None, str, Iterable[str]] = None,
+    vertical_scale: Optional[NDArray[np.float64]] = None,
+    labels: Optional[Iterable[str]] = None,
+    mode: str = "linear",
+) -> Iterator[tuple[tuple[str, str], NDArray[np.float64]]]:
+    # yields the aligned ((species, profile), column) one profile at a time,
+    # preceded by (("depth", ""), vertical scale).
+    # Only the columns of one profile are held in memory.
+
+    alig = open_alig_file(aligfile)
+
+    ref_dic, cores_dic = alig.profiles_data
+
+    if isinstance(species, str):
+        species_list = [species]
+    else:
+        species_list = list(ref_dic.keys()) if species is None else list(species)
 
-    # npits = len(labels)
+    labels = list(cores_dic.keys() if labels is None else labels)
 
-    # data = chem_profiles[species]
+    x = common_vertical_scale(ref_dic, species_list, vertical_scale)
+    x_dic = {bob: x for bob in species_list}
 
-    out = {}
+    yield ("depth", ""), x
 
     for profile in labels:
-        if species in cores_dic[profile] and profile in xp1_dic.keys():
-            xp = depth_sqz_str(
-                cores_dic[profile][species]["depth"], xp1_dic[profile], xp2_dic[profile]
-            )
+        aligned = align_labelled_profile(alig, profile, species_list, x_dic, mode)
 
-            fp = cores_dic[profile][species]["data"]
+        for bob in species_list:
+            signal_new = aligned[bob]
 
-            signal_new = np.interp(
-                x,
-                xp,
-                fp,
-                left=np.nan,
-                right=np.nan,
-            )
+            if signal_new is None:
+                print("missing data or tiepoints for ", profile, bob)
+                signal_new = np.full(len(x), np.nan)
+
+            yield (bob, profile), signal_new
+
+
+def write_alig_npz(aligfile: str, path: str, **kwargs: Any):
+    # one "species/profile" array per aligned column and a "depth" array,
+    # written to the archive as soon as computed
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for (bob, profile), column in iter_alig_columns(aligfile, **kwargs):
+            name = "depth" if bob == "depth" else bob + "/" + profile
+
+            with archive.open(name + ".npy", "w", force_zip64=True) as fp:
+                np.lib.format.write_array(fp, column, allow_pickle=False)
 
-            out[profile] = signal_new
 
+def _file_name(name: str) -> str:
+    # a species or profile name as a single file name: separators and
+    # characters not allowed on Windows are replaced, "." and ".." too
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", name)
+
+    return "_" * max(1, len(name)) if name in ("", ".", "..") else name
+
+
+def write_alig_npy(aligfile: str, path: str, **kwargs: Any):
+    # path is a directory with depth.npy and species/profile.npy files
+    for (bob, profile), column in iter_alig_columns(aligfile, **kwargs):
+        if bob == "depth":
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, "depth.npy"), column)
+        else:
+            directory = os.path.join(path, _file_name(bob))
+            os.makedirs(directory, exist_ok=True)
+            np.save(os.path.join(directory, _file_name(profile) + ".npy"), column)
+
+
+def _read_rows(filename: str, start: int, stop: int) -> NDArray[np.float64]:
+    # rows start:stop of a column saved with np.save: the file is only
+    # open while read (a memmap per column would keep every file open)
+    with open(filename, "rb") as fp:
+        version = np.lib.format.read_magic(fp)
+
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(fp)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(fp)
+
+        start = min(start, shape[0])
+        fp.seek(start * dtype.itemsize, os.SEEK_CUR)
+
+        return np.fromfile(fp, dtype=dtype, count=min(stop, shape[0]) - start)
+
+
+def write_alig_csv(
+    aligfile: str,
+    path: str,
+    species: Union[None, str, Iterable[str]] = None,
+    memory_budget: int = EXPORT_MEMORY_BUDGET,
+    **kwargs: Any,
+):
+    # same csv as load_alig_array(...).to_csv (for a single species)
+    # or as load_alig_arrays(...).to_csv, without building the table in memory:
+    # columns are computed one profile at a time into a temporary file,
+    # then the csv is written by chunks of rows.
+
+    columns_iter = iter_alig_columns(aligfile, species, **kwargs)
+
+    _, x = next(columns_iter)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmpdir:
+        keys: list[tuple[str, str]] = []
+        filenames: list[str] = []
+
+        for key, column in columns_iter:
+            filenames.append(os.path.join(tmpdir, "{}.npy".format(len(filenames))))
+            np.save(filenames[-1], column)
+            keys.append(key)
+
+        # species major column order, as in load_alig_arrays
+        species_rank = {bob: i for i, bob in enumerate(dict.fromkeys(bob for bob, _ in keys))}
+        order = sorted(range(len(keys)), key=lambda i: species_rank[keys[i][0]])
+
+        keys = [keys[i] for i in order]
+        filenames = [filenames[i] for i in order]
+
+        if isinstance(species, str) or not keys:
+            columns = pd.Index([profile for _, profile in keys])
         else:
-            print("missing data or tiepoints for ", profile)
-            out[profile] = np.full(len(x), np.nan)
+            columns = pd.MultiIndex.from_tuples(keys)
+
+        rows = max(1, memory_budget // (8 * max(1, len(keys))))
+
+        with open(path, "w", newline="") as fp:
+            pd.DataFrame(columns=columns).to_csv(fp)
+
+            for start in range(0, len(x), rows):
+                stop = start + rows
+                chunk = pd.DataFrame(
+                    {i: _read_rows(bob, start, stop) for i, bob in enumerate(filenames)},
+                    index=x[start:stop],
+                )
+                chunk.to_csv(fp, header=False)
+
 
-    return pd.DataFrame(data=out, index=x)
+def write_alig_file(aligfile: str, path: str, **kwargs: Any):
+    # the format is given by path: a .csv or .npz file, or a directory
+    # of .npy files (an existing directory or a path ending with a separator)
+    if path.endswith(".csv"):
+        write_alig_csv(aligfile, path, **kwargs)
+    elif path.endswith(".npz"):
+        write_alig_npz(aligfile, path, **kwargs)
+    elif os.path.isdir(path) or path.endswith((os.sep, "/")):
+        write_alig_npy(aligfile, path, **kwargs)
+    else:
+        raise ValueError("unknown export format for {}".format(path))
@@ -1,14 +1,6 @@
-from typing import Union
 # from typing import Iterable, cast, Optional, Any, Callable
 
-from matplotlib.collections import PathCollection
-from matplotlib.lines import Line2D
-from matplotlib.backend_bases import LocationEvent
-from numpy.typing import NDArray
-import numpy as np
-
 from .plt import plt
-from .magic import combine, transform
 
 
 def CreateFigure_main():
@@ -79,55 +71,3 @@ def CreateFigure_preview():
 
     return fig, ax, axc
 
-
-Artist = Union[PathCollection, Line2D]
-
-
-def eventdist(event: LocationEvent, artist: Artist):
-    if isinstance(artist, PathCollection):
-        xydata = artist.get_offsets()
-
-    else:
-        assert isinstance(artist, Line2D)
-        xydata = artist.get_xydata()
-
-    zipped = tuple(zip(*xydata))
-
-    if not zipped:
-        return None
-
-    depth1: NDArray[np.float64] = zipped[0]
-    signal1: NDArray[np.float64] = zipped[1]
-
-    event_ax = event.inaxes
-    assert event_ax is not None
-
-    artist_ax = artist.axes
-    assert artist_ax is not None
-
-    assert event.xdata is not None
-    assert event.ydata is not None
-    pt_data0 = (event.xdata, event.ydata)
-
-    combinedTransform = combine(event_ax.transData, artist_ax.transData)
-    pt_data1 = transform(combinedTransform)(pt_data0)
-
-    xlim1 = artist_ax.get_xlim()
-    ylim1 = artist_ax.get_ylim()
-    # xlim2 = ax2.get_xlim()
-    # ylim2 = ax2.get_ylim()
-
-    xrange1 = xlim1[1] - xlim1[0]
-    yrange1 = ylim1[1] - ylim1[0]
-    # xrange2 = xlim2[1]-xlim2[0]
-    # yrange2 = ylim2[1]-ylim2[0]
-
-    dist_to_artist = ((depth1 - pt_data1[0]) / xrange1) ** 2 + (
-        (signal1 - pt_data1[1]) / yrange1
-    ) ** 2
-
-    # event has x and y in data coordinates for ax2:
-
-    # Convert them into data coordinates for ax1:
-
-    return dist_to_artist
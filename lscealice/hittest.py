@@ -0,0 +1,84 @@
+from typing import Optional
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from matplotlib.axes import Axes
+from matplotlib.backend_bases import LocationEvent
+
+
+class DepthIndex:
+    # nearest point queries on (depth, value) points, with distances in units
+    # of the current view.
+    # Points are sorted by depth once, when the data changes. A query bisects
+    # the depth of the event and widens a window around it until no point
+    # outside the window can be closer: O(log n) for the samples of a profile.
+
+    def __init__(self, x: ArrayLike, y: ArrayLike):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        order = finite[np.argsort(x[finite], kind="stable")]
+
+        # indices of the sorted points in the original arrays
+        self.indices = order
+        self.x = x[order]
+        self.y = y[order]
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.x.nbytes + self.y.nbytes
+
+    def nearest(
+        self, x0: float, y0: float, xrange: float, yrange: float
+    ) -> Optional[tuple[int, float]]:
+        # index (in the original arrays) of the closest point and its
+        # squared distance in view units, None if there is no point
+        n = len(self.x)
+
+        if n == 0:
+            return None
+
+        i = int(np.searchsorted(self.x, x0))
+        width = 8
+
+        while True:
+            lo = max(0, i - width)
+            hi = min(n, i + width)
+
+            dist = ((self.x[lo:hi] - x0) / xrange) ** 2 + ((self.y[lo:hi] - y0) / yrange) ** 2
+
+            k = int(np.argmin(dist))
+            best = float(dist[k])
+
+            # depth distance to the closest points left out of the window
+            gap = np.inf
+            if lo > 0:
+                gap = min(gap, x0 - self.x[lo - 1])
+            if hi < n:
+                gap = min(gap, self.x[hi] - x0)
+
+            if (gap / xrange) ** 2 >= best:
+                return int(self.indices[lo + k]), best
+
+            width *= 4
+
+
+def event_position(event: LocationEvent, ax: Axes):
+    # position of the event in the data coordinates of ax
+    # and the ranges of the current view of ax
+    x, y = ax.transData.inverted().transform((event.x, event.y))
+
+    xlim = ax.get_xlim()
+    ylim = ax.get_ylim()
+
+    return float(x), float(y), xlim[1] - xlim[0], ylim[1] - ylim[0]
+
+
+def nearest_to_event(index: DepthIndex, event: LocationEvent, ax: Axes):
+    # closest point of index (in the data coordinates of ax) to the event
+    return index.nearest(*event_position(event, ax))
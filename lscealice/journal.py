@@ -0,0 +1,107 @@
+import json
+import os
+
+from typing import Any
+
+from .tiepoints import Tiepoint, TiepointStore
+
+Record = dict[str, Any]
+
+
+def journal_path(filename: str) -> str:
+    # the journal is a sidecar file living next to the alignment file
+    return filename + ".journal"
+
+
+def tiepoint_record(op: str, profile: str, tiepoint: Tiepoint) -> Record:
+    return {
+        "op": op,
+        "profile": profile,
+        "profile_depth": float(tiepoint["profile_depth"]),
+        "ref_depth": float(tiepoint["ref_depth"]),
+        "species": str(tiepoint["species"]),
+    }
+
+
+def append_records(filename: str, records: list[Record]):
+    if not records:
+        return
+
+    # one record per line, written in a single call so that an interrupted
+    # save leaves at most one truncated line at the end of the journal
+    lines = "".join(json.dumps(record) + "\n" for record in records)
+
+    with open(journal_path(filename), "a", encoding="utf-8") as fp:
+        fp.write(lines)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def read_records(filename: str) -> list[Record]:
+    path = journal_path(filename)
+
+    if not os.path.isfile(path):
+        return []
+
+    records: list[Record] = []
+
+    with open(path, encoding="utf-8") as fp:
+        for line in fp:
+            if not line.endswith("\n"):
+                # truncated last line from an interrupted append
+                break
+            records.append(json.loads(line))
+
+    return records
+
+
+def replay_records(tiepoints: dict[str, TiepointStore], records: list[Record]):
+    for record in records:
+        tiepoint: Tiepoint = {
+            "profile_depth": record["profile_depth"],
+            "ref_depth": record["ref_depth"],
+            "species": record["species"],
+        }
+
+        if record["profile"] not in tiepoints:
+            tiepoints[record["profile"]] = TiepointStore()
+
+        profile_tiepoints = tiepoints[record["profile"]]
+
+        if record["op"] == "add":
+            profile_tiepoints.insert(
+                tiepoint["profile_depth"], tiepoint["ref_depth"], tiepoint["species"]
+            )
+
+        else:
+            assert record["op"] == "delete"
+            profile_tiepoints.remove(tiepoint)
+
+
+def discard_journal(filename: str):
+    path = journal_path(filename)
+
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+class TiepointJournal:
+    # keeps the tiepoint operations made in the interface since the last save
+    # so that saving only appends these few records to the journal
+    # instead of rewriting the whole alignment file
+
+    def __init__(self):
+        self.pending: list[Record] = []
+
+    def add(self, profile: str, tiepoint: Tiepoint):
+        self.pending.append(tiepoint_record("add", profile, tiepoint))
+
+    def delete(self, profile: str, tiepoint: Tiepoint):
+        self.pending.append(tiepoint_record("delete", profile, tiepoint))
+
+    def take(self):
+        records, self.pending = self.pending, []
+        return records
+
+    def flush(self, filename: str):
+        append_records(filename, self.take())
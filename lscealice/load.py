@@ -1,47 +1,140 @@
+import os
+import threading
+
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+from numpy.typing import NDArray
+
 from .dic import load_dic_file
+from .journal import journal_path
+from .mapping import TiepointMapping
+from .tiepoints import TiepointStore
 
-def unzip_tiepoints(tiepoints):
+def unzip_tiepoints(tiepoints: dict[str, TiepointStore]):
 
-    # converts a tiepoints dic with lists of tiepoints
-    # to two dictionaries with sorted tiepoints as array
-    
-    xp1_dic: dict[str, list[float]] = {}
-    xp2_dic: dict[str, list[float]] = {}
+    # converts a tiepoints dic with the tiepoint stores of each profile
+    # to two dictionaries with sorted tiepoints as (read-only) arrays
 
-    for profile_key, tiepointlist in tiepoints.items():
-        xp = [(bob["profile_depth"], bob["ref_depth"]) for bob in tiepointlist]
+    xp1_dic: dict[str, NDArray[np.float64]] = {}
+    xp2_dic: dict[str, NDArray[np.float64]] = {}
 
-        if not xp:
+    for profile_key, store in tiepoints.items():
+        if not len(store):
             continue
 
-        # sort points
-        xp1, xp2 = zip(*sorted(xp))
-
-        xp1_dic[profile_key] = xp1
-        xp2_dic[profile_key] = xp2
+        # the stores are already sorted
+        xp1_dic[profile_key] = store.profile_depth
+        xp2_dic[profile_key] = store.ref_depth
 
     return xp1_dic, xp2_dic
-    
+
+
+def file_signature(aligfile: str):
+    # identifies the content of an alignment file (and of its tiepoints journal)
+    # without reading it
+
+    signature: list[object] = [os.path.abspath(aligfile)]
+
+    for filename in (aligfile, journal_path(aligfile)):
+        if os.path.exists(filename):
+            stat = os.stat(filename)
+            signature.extend((stat.st_mtime_ns, stat.st_size))
+        else:
+            signature.extend((None, None))
+
+    return tuple(signature)
+
+
+class AligFile:
+    # an alignment file loaded once, serving its cores, metadata and tiepoints.
+    # Use open_alig_file to get one, the returned dictionaries are shared
+    # and must not be modified.
+
+    def __init__(self, aligfile: str):
+        self.filename = aligfile
+        self.signature = file_signature(aligfile)
+        self.dic = load_dic_file(aligfile)
+
+        # mappings of each profile by mapping mode
+        self._mappings: dict[str, dict[str, TiepointMapping]] = {}
+
+    @cached_property
+    def profiles_data(self):
+        ref_dic = self.dic["cores"]["REF"]
+        cores_dic = {key: value for key, value in self.dic["cores"].items() if key != "REF"}
+
+        return ref_dic, cores_dic
+
+    @cached_property
+    def profiles_metadata(self):
+        ref_dic = self.dic["metadata"]["REF"]
+        cores_dic = {key: value for key, value in self.dic["metadata"].items() if key != "REF"}
+
+        return ref_dic, cores_dic
+
+    @cached_property
+    def marked_points(self):
+        return unzip_tiepoints(self.dic["tiepoints"])
+
+    def get_mappings(self, mode: str = "linear"):
+        if mode not in self._mappings:
+            xp1_dic, xp2_dic = self.marked_points
+
+            self._mappings[mode] = {
+                profile: TiepointMapping(xp1_dic[profile], xp2_dic[profile], mode)
+                for profile in xp1_dic.keys()
+            }
+
+        return self._mappings[mode]
+
+    @property
+    def mappings(self):
+        return self.get_mappings()
+
+
+# least recently used alignment files are evicted first
+ALIG_FILE_CACHE_SIZE = 4
+
+_alig_file_cache: "OrderedDict[str, AligFile]" = OrderedDict()
+_alig_file_cache_lock = threading.Lock()
+
+
+def open_alig_file(aligfile: str):
+    # load an alignment file, or reuse the previous load if the file
+    # has not changed on disk since then
+
+    key = os.path.abspath(aligfile)
+
+    with _alig_file_cache_lock:
+        alig = _alig_file_cache.pop(key, None)
+
+        if alig is None or alig.signature != file_signature(aligfile):
+            alig = AligFile(aligfile)
+
+        _alig_file_cache[key] = alig
+
+        while len(_alig_file_cache) > ALIG_FILE_CACHE_SIZE:
+            _alig_file_cache.popitem(last=False)
+
+    return alig
+
+
 def load_marked_points(aligfile: str):
-    # convert the tiepoints stored in the dictionary to the xp1 and xp2 lists
+    # convert the tiepoints stored in the dictionary to the xp1 and xp2 arrays
 
-    new_dic = load_dic_file(aligfile)
+    xp1_dic, xp2_dic = open_alig_file(aligfile).marked_points
 
-    return unzip_tiepoints(new_dic['tiepoints'])
+    return dict(xp1_dic), dict(xp2_dic)
 
 
 def load_profiles_data(aligfile: str):
-    full_dic = load_dic_file(aligfile)
+    ref_dic, cores_dic = open_alig_file(aligfile).profiles_data
 
-    cores_dic = {key: value for key, value in full_dic["cores"].items() if key != "REF"}
-    ref_dic = full_dic["cores"]["REF"]
+    return ref_dic, dict(cores_dic)
 
-    return ref_dic, cores_dic
-    
 def load_profiles_metadata(aligfile: str):
-    full_dic = load_dic_file(aligfile)
-
-    cores_dic = {key: value for key, value in full_dic["metadata"].items() if key != "REF"}
-    ref_dic = full_dic["metadata"]["REF"]
+    ref_dic, cores_dic = open_alig_file(aligfile).profiles_metadata
 
-    return ref_dic, cores_dic
+    return ref_dic, dict(cores_dic)
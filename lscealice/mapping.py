@@ -0,0 +1,464 @@
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+
+class PiecewiseLinear:
+    # piecewise linear function through the points (x, y), sorted by x then y,
+    # constant beyond the first and last points (as np.interp).
+    #
+    # Points sharing the same x make a discontinuity: the function takes the
+    # value of the first of these points from the left, and of the last one
+    # from the right and at x itself.
+
+    def __init__(self, x: NDArray[np.float64], y: NDArray[np.float64]):
+        self.x = x
+        self.y = y
+
+        # without coincident x this is exactly np.interp
+        self.continuous = bool(np.all(np.diff(x) > 0))
+
+    def __call__(self, t: ArrayLike) -> NDArray[np.float64]:
+        t = np.asarray(t, dtype=np.float64)
+
+        n = len(self.x)
+
+        if n == 0:
+            return np.full(t.shape, np.nan)
+
+        if self.continuous:
+            return np.interp(t, self.x, self.y)
+
+        # segment [left, right] containing t, where x[left] is the last point
+        # at or before t and x[right] the first point after t.
+        # Zero width segments (discontinuities) are never selected.
+        i = np.searchsorted(self.x, t, side="right")
+        left = np.clip(i - 1, 0, n - 1)
+        right = np.clip(i, 0, n - 1)
+
+        x0 = self.x[left]
+        y0 = self.y[left]
+        dx = self.x[right] - x0
+
+        slope = np.zeros(t.shape)
+        np.divide(self.y[right] - y0, dx, out=slope, where=dx > 0)
+
+        return slope * (t - x0) + y0
+
+
+def pchip_slopes(x: NDArray[np.float64], y: NDArray[np.float64]) -> NDArray[np.float64]:
+    # derivatives at the points of a monotone (shape preserving) cubic
+    # Hermite interpolant, after Fritsch and Carlson; x strictly increasing
+    h = np.diff(x)
+    delta = np.diff(y) / h
+
+    if len(x) == 2:
+        return np.array([delta[0], delta[0]])
+
+    slopes = np.zeros(len(x))
+
+    # weighted harmonic mean of the secants, zero at local extrema
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = delta[:-1] * delta[1:] > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes[1:-1] = np.where(same_sign, (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:]), 0)
+
+    def edge(h0: float, h1: float, m0: float, m1: float):
+        # one sided three points estimate, kept shape preserving
+        slope = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        if np.sign(slope) != np.sign(m0):
+            return 0.0
+        if np.sign(m0) != np.sign(m1) and abs(slope) > abs(3 * m0):
+            return 3 * m0
+        return slope
+
+    slopes[0] = edge(h[0], h[1], delta[0], delta[1])
+    slopes[-1] = edge(h[-1], h[-2], delta[-1], delta[-2])
+
+    return slopes
+
+
+def _solve_pentadiagonal(
+    d0: NDArray[np.float64], d1: NDArray[np.float64], d2: NDArray[np.float64], b: NDArray[np.float64]
+) -> NDArray[np.float64]:
+    # solve A x = b for a symmetric positive definite pentadiagonal A
+    # with diagonal d0 and upper diagonals d1 and d2, by LDL^T factorisation
+    m = len(d0)
+    d0l, d1l, d2l = d0.tolist(), d1.tolist() + [0.0, 0.0], d2.tolist() + [0.0, 0.0]
+
+    D = [0.0] * m
+    l1 = [0.0] * (m + 2)
+    l2 = [0.0] * (m + 2)
+
+    for k in range(m):
+        if k >= 2:
+            l2[k] = d2l[k - 2] / D[k - 2]
+        if k >= 1:
+            l1[k] = (d1l[k - 1] - l2[k] * D[k - 2] * l1[k - 1] if k >= 2 else d1l[k - 1]) / D[k - 1]
+        D[k] = d0l[k] - l1[k] ** 2 * (D[k - 1] if k >= 1 else 0.0) - l2[k] ** 2 * (D[k - 2] if k >= 2 else 0.0)
+
+    z = b.tolist()
+    for k in range(1, m):
+        z[k] -= l1[k] * z[k - 1] + (l2[k] * z[k - 2] if k >= 2 else 0.0)
+
+    x = [zk / Dk for zk, Dk in zip(z, D)]
+    for k in range(m - 2, -1, -1):
+        x[k] -= l1[k + 1] * x[k + 1] + (l2[k + 2] * x[k + 2] if k + 2 < m else 0.0)
+
+    return np.array(x)
+
+
+def smoothing_spline(
+    x: NDArray[np.float64], y: NDArray[np.float64], smoothing: float
+) -> tuple[NDArray[np.float64], NDArray[np.float64]]:
+    # natural cubic smoothing spline minimising
+    #   sum (y - f(x))**2 + lam * integral f''**2
+    # with lam = smoothing * mean(h)**3 so that smoothing does not depend on
+    # the depth units (smoothing = 0 interpolates the points).
+    # Returns the fitted values and the second derivatives at x (Reinsch).
+    n = len(x)
+    h = np.diff(x)
+
+    if n < 3:
+        return y.copy(), np.zeros(n)
+
+    lam = smoothing * float(np.mean(h)) ** 3
+
+    # Q (n x n-2) has columns (1/h[k], -1/h[k] - 1/h[k+1], 1/h[k+1])
+    q0 = 1 / h[:-1]
+    q1 = -1 / h[:-1] - 1 / h[1:]
+    q2 = 1 / h[1:]
+
+    # R + lam Q^T Q is pentadiagonal
+    d0 = (h[:-1] + h[1:]) / 3 + lam * (q0**2 + q1**2 + q2**2)
+    d1 = h[1:-1] / 6 + lam * (q1[:-1] * q0[1:] + q2[:-1] * q1[1:])
+    d2 = lam * q2[:-2] * q0[2:]
+
+    gamma = np.zeros(n)
+    gamma[1:-1] = _solve_pentadiagonal(d0, d1, d2, q0 * y[:-2] + q1 * y[1:-1] + q2 * y[2:])
+
+    # fitted values y - lam Q gamma
+    qgamma = np.zeros(n)
+    qgamma[:-2] += q0 * gamma[1:-1]
+    qgamma[1:-1] += q1 * gamma[1:-1]
+    qgamma[2:] += q2 * gamma[1:-1]
+
+    return y - lam * qgamma, gamma
+
+
+def cubic_coefficients(
+    x: NDArray[np.float64], y: NDArray[np.float64], mode: str, smoothing: float
+) -> NDArray[np.float64]:
+    # polynomial coefficients (a, b, c, d) of the cubic
+    #   a + b s + c s**2 + d s**3 with s = t - x[k]
+    # on each segment [x[k], x[k+1]], for points sorted by x then y.
+    # Runs of strictly increasing x are fitted separately, so that
+    # coincident x (hiatus) stay discontinuities.
+    n = len(x)
+    coefficients = np.zeros((4, n))
+    coefficients[0] = y
+
+    breaks = np.flatnonzero(np.diff(x) == 0) + 1
+
+    for start, stop in zip(np.r_[0, breaks], np.r_[breaks, n]):
+        xs = x[start:stop]
+        ys = y[start:stop]
+
+        if len(xs) < 2:
+            continue
+
+        h = np.diff(xs)
+
+        if mode == "pchip":
+            a = ys
+            slopes = pchip_slopes(xs, ys)
+            delta = np.diff(ys) / h
+            b = slopes[:-1]
+            c = (3 * delta - 2 * slopes[:-1] - slopes[1:]) / h
+            d = (slopes[:-1] + slopes[1:] - 2 * delta) / h**2
+
+        else:
+            assert mode == "spline"
+            a, gamma = smoothing_spline(xs, ys, smoothing)
+            b = np.diff(a) / h - h * (2 * gamma[:-1] + gamma[1:]) / 6
+            c = gamma[:-1] / 2
+            d = np.diff(gamma) / (6 * h)
+
+        # the last point of the run keeps a constant segment
+        coefficients[0, start:stop] = a
+        coefficients[1:, start : stop - 1] = (b, c, d)
+
+    return coefficients
+
+
+class PiecewiseCubic:
+    # piecewise cubic function with knots x and coefficients from
+    # cubic_coefficients, constant beyond the first and last knots,
+    # with the same discontinuities as PiecewiseLinear
+
+    def __init__(self, x: NDArray[np.float64], coefficients: NDArray[np.float64]):
+        self.x = x
+        self.coefficients = coefficients
+
+    def __call__(self, t: ArrayLike) -> NDArray[np.float64]:
+        t = np.asarray(t, dtype=np.float64)
+
+        n = len(self.x)
+
+        if n == 0:
+            return np.full(t.shape, np.nan)
+
+        left = np.clip(np.searchsorted(self.x, t, side="right") - 1, 0, n - 1)
+        s = t - self.x[left]
+
+        a, b, c, d = self.coefficients[:, left]
+
+        out = a + s * (b + s * (c + s * d))
+
+        return np.where(t < self.x[0], self.coefficients[0, 0], out)
+
+
+class Intervals:
+    # a union of intervals (lo, hi) answering membership for whole arrays
+
+    def __init__(self, lo: NDArray[np.float64], hi: NDArray[np.float64]):
+        order = np.argsort(lo, kind="stable")
+        self.lo = lo[order]
+        # furthest end of the intervals starting before each lo
+        self.hi = np.maximum.accumulate(hi[order]) if len(hi) else hi
+
+    def __len__(self):
+        return len(self.lo)
+
+    def contains(self, t: NDArray[np.float64], closed: bool) -> NDArray[np.bool_]:
+        if len(self) == 0:
+            return np.zeros(t.shape, dtype=bool)
+
+        k = np.searchsorted(self.lo, t, side="right" if closed else "left") - 1
+        hi = self.hi[np.clip(k, 0, None)]
+
+        return (k >= 0) & ((t <= hi) if closed else (t < hi))
+
+
+# depth mapping modes: linear, monotone cubic or cubic spline between tiepoints
+MAPPING_MODES = ("linear", "pchip", "spline")
+
+# default smoothing of the spline mode, see smoothing_spline: the spline
+# goes through the tiepoints, as the other modes, so that forward and
+# inverse map each tiepoint onto the other
+SPLINE_SMOOTHING = 0.0
+
+
+class TiepointMapping:
+    # the depth mapping defined by the tiepoints of a profile:
+    # tiepoints are validated and sorted once, and kept as contiguous arrays
+    # to evaluate the mapping on whole depth arrays.
+    #
+    # forward maps profile depths to reference depths,
+    # inverse maps reference depths to profile depths.
+    #
+    # Tiepoints sharing the same profile depth describe a hiatus in the profile:
+    # the mapping jumps from the lowest to the highest of their reference depths.
+    # Consecutive tiepoints going up in reference depth are crossing tiepoints:
+    # they are flagged, and the reference depths they fold onto are left
+    # out of resampled profiles, like the reference depths missing in a hiatus.
+    #
+    # Between tiepoints the mapping is linear, a monotone cubic (mode="pchip")
+    # or a natural cubic spline (mode="spline", smoothed if smoothing > 0),
+    # whose coefficients are computed once here. The inverse of a cubic
+    # mapping is the same kind of cubic through the tiepoints taken the
+    # other way round.
+
+    xp1: NDArray[np.float64]
+    xp2: NDArray[np.float64]
+
+    def __init__(
+        self,
+        xp1: ArrayLike,
+        xp2: ArrayLike,
+        mode: str = "linear",
+        smoothing: float = SPLINE_SMOOTHING,
+    ):
+        if mode not in MAPPING_MODES:
+            raise ValueError("unknown mapping mode {}".format(mode))
+
+        self.mode = mode
+
+        xp1 = np.asarray(xp1, dtype=np.float64).ravel()
+        xp2 = np.asarray(xp2, dtype=np.float64).ravel()
+
+        if xp1.shape != xp2.shape:
+            raise ValueError("xp1 and xp2 must have the same length")
+
+        # tiepoints with a missing depth cannot be used
+        valid = np.isfinite(xp1) & np.isfinite(xp2)
+        xp1 = xp1[valid]
+        xp2 = xp2[valid]
+
+        # sorted by profile depth, then by reference depth
+        order = np.lexsort((xp2, xp1))
+        xp1 = xp1[order]
+        xp2 = xp2[order]
+
+        # duplicated tiepoints only count once
+        unique = np.ones(len(xp1), dtype=bool)
+        unique[1:] = (np.diff(xp1) != 0) | (np.diff(xp2) != 0)
+
+        self.xp1 = np.ascontiguousarray(xp1[unique])
+        self.xp2 = np.ascontiguousarray(xp2[unique])
+
+        # and the other way round for the inverse mapping
+        order = np.lexsort((self.xp1, self.xp2))
+        self.inv_xp2 = np.ascontiguousarray(self.xp2[order])
+        self.inv_xp1 = np.ascontiguousarray(self.xp1[order])
+
+        # mappings are shared through the cache
+        for array in (self.xp1, self.xp2, self.inv_xp1, self.inv_xp2):
+            array.flags.writeable = False
+
+        if mode == "linear":
+            self._forward = PiecewiseLinear(self.xp1, self.xp2)
+            self._inverse = PiecewiseLinear(self.inv_xp2, self.inv_xp1)
+
+            # mapped depth at each tiepoint
+            knots = self.xp2
+
+        else:
+            coefficients = cubic_coefficients(self.xp1, self.xp2, mode, smoothing)
+            self._forward = PiecewiseCubic(self.xp1, coefficients)
+            self._inverse = PiecewiseCubic(
+                self.inv_xp2,
+                cubic_coefficients(self.inv_xp2, self.inv_xp1, mode, smoothing),
+            )
+
+            # a spline with smoothing > 0 does not go through the tiepoints
+            knots = coefficients[0]
+
+        dxp1 = np.diff(self.xp1)
+        dxp2 = np.diff(knots)
+
+        hiatus = dxp1 == 0
+        crossing = (dxp1 > 0) & (dxp2 < 0)
+
+        # tiepoints at either end of a crossing segment
+        self.crossing = np.zeros(len(self.xp1), dtype=bool)
+        self.crossing[:-1] |= crossing
+        self.crossing[1:] |= crossing
+
+        # profile depth of each hiatus and the reference depths it jumps over
+        self.hiatus_depth = self.xp1[:-1][hiatus]
+        self.hiatus_lo = knots[:-1][hiatus]
+        self.hiatus_hi = knots[1:][hiatus]
+
+        # reference depths folded over by crossing segments
+        self.folds = Intervals(knots[1:][crossing], knots[:-1][crossing])
+
+        # upper ends of all the reference depth intervals without data
+        self.gaps_hi = np.sort(np.concatenate((self.hiatus_hi, knots[:-1][crossing])))
+
+    def __len__(self):
+        return len(self.xp1)
+
+    @property
+    def has_crossings(self):
+        return bool(self.crossing.any())
+
+    def forward(self, depth1: ArrayLike) -> NDArray[np.float64]:
+        return self._forward(depth1)
+
+    def inverse(self, depth2: ArrayLike) -> NDArray[np.float64]:
+        return self._inverse(depth2)
+
+    __call__ = forward
+
+    def resample(
+        self,
+        depth1: NDArray[np.float64],
+        signal1: NDArray[np.float64],
+        depth2: NDArray[np.float64],
+        depth_new: Optional[NDArray[np.float64]] = None,
+    ) -> NDArray[np.float64]:
+        # the profile signal on the reference depths depth2, NaN outside of
+        # the profile, in hiatus and in folds.
+        # depth_new can be given if forward(depth1) is already known.
+
+        if len(self.xp1) == 0:
+            # no mapping without tiepoints
+            return np.full(np.shape(depth2), np.nan)
+
+        if depth_new is None:
+            depth_new = self.forward(depth1)
+
+        if self.mode != "linear":
+            # a cubic can overshoot between tiepoints,
+            # drop the samples it maps back up
+            keep = depth_new >= np.fmax.accumulate(depth_new)
+            if not keep.any():
+                return np.full(np.shape(depth2), np.nan)
+            if not keep.all():
+                depth1 = depth1[keep]
+                signal1 = signal1[keep]
+                depth_new = depth_new[keep]
+
+        if len(self.gaps_hi) == 0:
+            return np.interp(depth2, depth_new, signal1, left=np.nan, right=np.nan)
+
+        depth2 = np.asarray(depth2, dtype=np.float64)
+
+        if len(self.folds):
+            # samples mapped into a fold are ambiguous, once they are removed
+            # the mapped depths are increasing again
+            keep = ~self.folds.contains(depth_new, closed=True)
+            depth_new = depth_new[keep]
+            signal1_kept = signal1[keep]
+        else:
+            signal1_kept = signal1
+
+        if len(self.hiatus_depth) and len(depth1):
+            # the signal at a hiatus is found on both sides of the jump
+            inside = (self.hiatus_depth >= depth1[0]) & (self.hiatus_depth <= depth1[-1])
+            signal_hiatus = np.interp(self.hiatus_depth[inside], depth1, signal1)
+
+            edges = np.concatenate((self.hiatus_lo[inside], self.hiatus_hi[inside]))
+            order = np.argsort(edges, kind="stable")
+            edges = edges[order]
+            position = np.searchsorted(depth_new, edges, side="right")
+
+            depth_new = np.insert(depth_new, position, edges)
+            signal1_kept = np.insert(
+                signal1_kept, position, np.tile(signal_hiatus, 2)[order]
+            )
+
+        signal_new = np.interp(
+            depth2, depth_new, signal1_kept, left=np.nan, right=np.nan
+        )
+
+        if len(depth_new) > 1:
+            # do not interpolate between two samples on either side of a gap:
+            # compare the number of gaps ending below each of them
+            gaps_below = np.searchsorted(self.gaps_hi, depth_new, side="right")
+
+            j = np.clip(np.searchsorted(depth_new, depth2, side="right"), 1, len(depth_new) - 1)
+
+            across = (gaps_below[j] != gaps_below[j - 1]) & (depth2 > depth_new[j - 1])
+            signal_new[across] = np.nan
+
+        return signal_new
+
+
+@lru_cache(maxsize=1024)
+def _cached_mapping(xp1: bytes, xp2: bytes, mode: str):
+    # the tiepoints are keyed by the bytes of their float64 arrays
+    return TiepointMapping(np.frombuffer(xp1), np.frombuffer(xp2), mode)
+
+
+def tiepoint_mapping(xp1: ArrayLike, xp2: ArrayLike, mode: str = "linear") -> TiepointMapping:
+    # memoised by tiepoints: the same tiepoints give back the same mapping
+    xp1 = np.ascontiguousarray(xp1, dtype=np.float64).ravel()
+    xp2 = np.ascontiguousarray(xp2, dtype=np.float64).ravel()
+
+    return _cached_mapping(xp1.tobytes(), xp2.tobytes(), mode)
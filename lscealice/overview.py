@@ -0,0 +1,110 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from .dic import Cores
+from .draw.decimate import MinMaxPyramid
+from .export import align_profile
+from .mapping import tiepoint_mapping
+from .tiepoints import TiepointStore
+
+
+# vertices drawn for all the profiles of the overview together
+OVERVIEW_VERTEX_BUDGET = 200_000
+
+
+class AlignedProfiles:
+    # the aligned signals of every profile for one species, on the reference
+    # depths, computed once through the export path (export.align_profile)
+    # and then only recomputed for the profiles whose tiepoints changed.
+    # Each aligned signal is kept as a decimation pyramid.
+
+    def __init__(self, cores: dict[str, dict[str, Cores]], species: str, mode: str = "linear"):
+        self.cores = cores
+        self.species = species
+        self.mode = mode
+
+        self.depth: NDArray[np.float64] = cores["REF"][species]["depth"]
+
+        # tiepoints each profile was aligned with
+        self.keys: dict[str, tuple[bytes, bytes]] = {}
+
+        self.pyramids: dict[str, MinMaxPyramid] = {}
+        self.ranges: dict[str, tuple[float, float]] = {}
+
+    @property
+    def profiles(self):
+        # aligned profiles, in the order of the file
+        return [profile for profile in self.cores.keys() if profile in self.pyramids]
+
+    def refresh(self, tiepoints: dict[str, TiepointStore]) -> list[str]:
+        # align the profiles whose tiepoints changed since the last refresh,
+        # returns their names. Profiles without tiepoints are left out,
+        # as in the export.
+        changed: list[str] = []
+
+        for profile, core_dic in self.cores.items():
+            if profile == "REF" or self.species not in core_dic:
+                continue
+
+            store = tiepoints.get(profile, TiepointStore())
+
+            xp1 = store.profile_depth
+            xp2 = store.ref_depth
+
+            key = (xp1.tobytes(), xp2.tobytes())
+
+            if self.keys.get(profile) == key:
+                continue
+
+            self.keys[profile] = key
+            changed.append(profile)
+
+            if not len(xp1):
+                self.pyramids.pop(profile, None)
+                self.ranges.pop(profile, None)
+                continue
+
+            mapping = tiepoint_mapping(xp1, xp2, self.mode)
+
+            signal = align_profile(core_dic, mapping, [self.species], {self.species: self.depth})[
+                self.species
+            ]
+            assert signal is not None
+
+            self.pyramids[profile] = MinMaxPyramid(self.depth, signal)
+            self.ranges[profile] = self.pyramids[profile].minmax()
+
+        return changed
+
+    def blocks(self, width: int):
+        # decimation of each profile for a view `width` pixels wide,
+        # within OVERVIEW_VERTEX_BUDGET for all the profiles
+        return max(8, min(width, OVERVIEW_VERTEX_BUDGET // (2 * max(1, len(self.pyramids)))))
+
+    def _segment(
+        self, profile: str, rank: int, xmin: float, xmax: float, blocks: int, stacked: bool
+    ) -> NDArray[np.float64]:
+        # (n, 2) vertices of profile between xmin and xmax.
+        # Stacked profiles are scaled to [0, 0.9] and offset by their rank.
+        x, y = self.pyramids[profile].query(xmin, xmax, blocks)
+
+        if stacked:
+            lo, hi = self.ranges[profile]
+            scale = 0.9 / (hi - lo) if hi > lo else 0.0
+            y = rank + (y - lo) * scale
+
+        return np.c_[x, y]
+
+    def segment(self, profile: str, xmin: float, xmax: float, width: int, stacked: bool = True):
+        rank = self.profiles.index(profile)
+
+        return self._segment(profile, rank, xmin, xmax, self.blocks(width), stacked)
+
+    def segments(self, xmin: float, xmax: float, width: int, stacked: bool = True):
+        # one array of vertices per profile for a LineCollection
+        blocks = self.blocks(width)
+
+        return [
+            self._segment(profile, rank, xmin, xmax, blocks, stacked)
+            for rank, profile in enumerate(self.profiles)
+        ]
@@ -0,0 +1,175 @@
+import threading
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .dic import Cores
+from .draw.decimate import MinMaxPyramid
+from .hittest import DepthIndex
+from .mapping import tiepoint_mapping
+
+
+# memory held by the render payloads of the profiles and species displayed
+# or about to be displayed
+RENDER_CACHE_BYTES = 512 * 2**20
+
+
+class LinePayload:
+    # decimation (which also gives the y limits) and hit-testing
+    # of one profile and species, only depends on the data
+
+    def __init__(self, core: Cores):
+        self.pyramid = MinMaxPyramid(core["depth"], core["data"])
+        self.index = DepthIndex(core["depth"], core["data"])
+
+    @property
+    def nbytes(self):
+        return self.pyramid.nbytes + self.index.nbytes
+
+
+class PreviewPayload:
+    # depth mapping of a profile and its signal aligned on the reference depths,
+    # for a given set of tiepoints and mapping mode
+
+    def __init__(
+        self,
+        core: Cores,
+        ref: Cores,
+        xp1: NDArray[np.float64],
+        xp2: NDArray[np.float64],
+        mode: str,
+    ):
+        self.mapping = tiepoint_mapping(xp1, xp2, mode)
+
+        signal_new = self.mapping.resample(core["depth"], core["data"], ref["depth"])
+
+        self.pyramid = MinMaxPyramid(ref["depth"], signal_new)
+
+    @property
+    def nbytes(self):
+        return self.pyramid.nbytes
+
+
+def line_key(profile: str, species: str):
+    return ("line", profile, species)
+
+
+def preview_key(
+    profile: str, species: str, xp1: NDArray[np.float64], xp2: NDArray[np.float64], mode: str
+):
+    # the tiepoints are part of the key: editing them gives a new payload
+    return ("preview", profile, species, xp1.tobytes(), xp2.tobytes(), mode)
+
+
+class RenderCache:
+    # payloads by key, the least recently used are evicted first
+    # once they hold more than max_bytes (the last one put is always kept).
+    # Shared by the interface and the Prefetcher thread.
+
+    def __init__(self, max_bytes: int = RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+
+        self.items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.sizes: dict[Hashable, int] = {}
+        self.total = 0
+
+        self.lock = threading.Lock()
+
+    def __contains__(self, key: Hashable):
+        with self.lock:
+            return key in self.items
+
+    def get(self, key: Hashable):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self.lock:
+            if key in self.items:
+                self.total -= self.sizes[key]
+
+            self.items[key] = value
+            self.items.move_to_end(key)
+            self.sizes[key] = value.nbytes
+            self.total += value.nbytes
+
+            while self.total > self.max_bytes and len(self.items) > 1:
+                old_key, _ = self.items.popitem(last=False)
+                self.total -= self.sizes.pop(old_key)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]):
+        value = self.get(key)
+
+        if value is None:
+            value = compute()
+            self.put(key, value)
+
+        return value
+
+
+Job = tuple[Hashable, Callable[[], Any]]
+
+
+class Prefetcher:
+    # computes payloads in a background thread, so that switching to a
+    # neighbouring profile or species only picks them from the cache.
+    # A new request replaces the jobs not started yet: only the
+    # neighbours of the last profile and species displayed are computed.
+
+    def __init__(self):
+        self.condition = threading.Condition()
+
+        # the cache of the last request, jobs are only queued with one
+        self.cache: Optional[RenderCache] = None
+        self.jobs: list[Job] = []
+        self.closed = False
+
+        self.thread = threading.Thread(
+            target=self.run, name="alice-prefetch", daemon=True
+        )
+        self.thread.start()
+
+    def request(self, cache: RenderCache, jobs: list[Job]):
+        # jobs must not read anything the interface modifies
+        # (the tiepoint arrays of the stores are never modified in place)
+        with self.condition:
+            self.cache = cache
+            self.jobs = list(jobs)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs and not self.closed:
+                    self.condition.wait()
+
+                if self.closed:
+                    return
+
+                cache = self.cache
+                key, compute = self.jobs.pop(0)
+
+            assert cache is not None
+
+            if key in cache:
+                continue
+
+            try:
+                cache.put(key, compute())
+            except Exception as e:
+                # prefetching is only a hint, the interface computes
+                # (and reports) what is missing when displayed
+                print("prefetch failed for", key[:3], e)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        self.thread.join()
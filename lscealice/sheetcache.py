@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from typing import Any, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+import pandas as pd
+
+from .excel import read_workbook
+from .system import cache_dir
+
+
+# disk space used by the parsed sheets, the least recently used
+# workbooks are evicted first
+SHEET_CACHE_BYTES = 1024 * 2**20
+
+# bumped when the layout of the cached sheets changes
+SHEET_CACHE_VERSION = 1
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(2**20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _encode_column(k: int, values: list[Any]) -> dict[str, NDArray[Any]]:
+    # the first cell (the name of the column) is kept apart so that
+    # the rest of a column of numbers is saved as a typed array
+    body = values[1:]
+
+    if body and all(type(bob) is float for bob in body):
+        return {f"h{k}": np.array(values[:1], dtype=object), f"f{k}": np.array(body)}
+
+    if body and all(type(bob) is int for bob in body):
+        return {f"h{k}": np.array(values[:1], dtype=object), f"i{k}": np.array(body)}
+
+    return {f"o{k}": np.array(values, dtype=object)}
+
+
+def encode_sheet(df: pd.DataFrame) -> dict[str, NDArray[Any]]:
+    arrays: dict[str, NDArray[Any]] = {}
+
+    for k in range(df.shape[1]):
+        column = df.iloc[:, k]
+
+        if column.dtype != object:
+            arrays[f"t{k}"] = column.to_numpy()
+        else:
+            arrays.update(_encode_column(k, column.tolist()))
+
+    return arrays
+
+
+def decode_sheet(arrays: Any, ncolumns: int) -> pd.DataFrame:
+    columns: dict[int, Any] = {}
+
+    for k in range(ncolumns):
+        if f"t{k}" in arrays:
+            columns[k] = arrays[f"t{k}"]
+        elif f"o{k}" in arrays:
+            columns[k] = arrays[f"o{k}"]
+        else:
+            body = arrays[f"f{k}"] if f"f{k}" in arrays else arrays[f"i{k}"]
+            columns[k] = np.array(arrays[f"h{k}"].tolist() + body.tolist(), dtype=object)
+
+    return pd.DataFrame(columns)
+
+
+class SheetCache:
+    # parsed sheets of the workbooks, on disk as numpy arrays: re-reading
+    # an unchanged workbook skips the excel parser altogether.
+    #
+    # Workbooks are keyed by the hash of their content, so a copied or touched
+    # file is still found; the hash of a path is itself remembered with the
+    # size and mtime of the file, so unchanged files are not even read.
+    # Each workbook is a directory with its sheet names (in order) and one
+    # npz file per sheet; object columns are pickled in the npz files,
+    # the cache must only be shared with trusted users.
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = SHEET_CACHE_BYTES):
+        self.path = os.path.join(
+            cache_dir() if path is None else path, f"sheets-v{SHEET_CACHE_VERSION}"
+        )
+        self.max_bytes = max_bytes
+
+    def _stat_path(self, datafile: str):
+        name = hashlib.sha1(os.path.abspath(datafile).encode()).hexdigest()
+        return os.path.join(self.path, "paths", name + ".json")
+
+    def digest(self, datafile: str) -> str:
+        stat = os.stat(datafile)
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        stat_path = self._stat_path(datafile)
+
+        try:
+            with open(stat_path, encoding="utf-8") as fp:
+                known = json.load(fp)
+            if known["signature"] == signature:
+                return known["digest"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        digest = file_digest(datafile)
+
+        try:
+            os.makedirs(os.path.dirname(stat_path), exist_ok=True)
+            self._write_json(stat_path, {"signature": signature, "digest": digest})
+        except OSError:
+            pass
+
+        return digest
+
+    @staticmethod
+    def _write_json(path: str, content: Any):
+        tmpfilename = path + f".{os.getpid()}.tmp"
+
+        with open(tmpfilename, "w", encoding="utf-8") as fp:
+            json.dump(content, fp)
+
+        os.replace(tmpfilename, path)
+
+    def get(self, digest: str) -> Optional[dict[str, pd.DataFrame]]:
+        entry = os.path.join(self.path, digest)
+
+        try:
+            with open(os.path.join(entry, "sheets.json"), encoding="utf-8") as fp:
+                manifest = json.load(fp)
+
+            sheets: dict[str, pd.DataFrame] = {}
+            for k, (name, ncolumns) in enumerate(manifest):
+                with np.load(os.path.join(entry, f"{k}.npz"), allow_pickle=True) as arrays:
+                    sheets[name] = decode_sheet(arrays, ncolumns)
+
+            # recently used entries are evicted last
+            os.utime(entry)
+
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return sheets
+
+    def put(self, digest: str, sheets: dict[str, pd.DataFrame]):
+        os.makedirs(self.path, exist_ok=True)
+
+        # written aside and renamed, so that readers (and other processes
+        # writing the same workbook) never see a partial entry
+        tmpentry = tempfile.mkdtemp(dir=self.path, prefix=".tmp-")
+
+        try:
+            manifest = []
+            for k, (name, df) in enumerate(sheets.items()):
+                np.savez(os.path.join(tmpentry, f"{k}.npz"), **encode_sheet(df))
+                manifest.append((name, df.shape[1]))
+
+            self._write_json(os.path.join(tmpentry, "sheets.json"), manifest)
+
+            os.replace(tmpentry, os.path.join(self.path, digest))
+        except OSError:
+            # already written by another process
+            shutil.rmtree(tmpentry, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        entries: list[tuple[float, int, str]] = []
+
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name == "paths" or name.startswith(".") or not os.path.isdir(entry):
+                continue
+
+            try:
+                size = sum(bob.stat().st_size for bob in os.scandir(entry))
+                entries.append((os.stat(entry).st_mtime, size, entry))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def read_workbook(self, datafile: str) -> dict[str, pd.DataFrame]:
+        # as excel.read_workbook, from the cache when the content is known
+        digest = self.digest(datafile)
+
+        sheets = self.get(digest)
+
+        if sheets is None:
+            sheets = read_workbook(datafile)
+
+            try:
+                self.put(digest, sheets)
+            except OSError as e:
+                # the cache is only an optimisation
+                print("could not cache the sheets of", datafile, e)
+
+        return sheets
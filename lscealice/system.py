@@ -11,3 +11,19 @@ def resolve_path(path: str) -> str:
     )
 
     return os.path.abspath(Path(origin, path))
+
+
+def cache_dir() -> str:
+    # per user cache directory of lscealice, LSCEALICE_CACHE_DIR overrides it
+    if os.environ.get("LSCEALICE_CACHE_DIR"):
+        return os.path.abspath(os.environ["LSCEALICE_CACHE_DIR"])
+
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "lscealice", "Cache")
+
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches/lscealice")
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "lscealice")
@@ -0,0 +1,227 @@
+from typing import Any, Iterable, Iterator, Optional, TypedDict
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class Tiepoint(TypedDict):
+    profile_depth: float
+    ref_depth: float
+    species: str
+
+
+def _frozen(array: NDArray[Any]) -> NDArray[Any]:
+    array.flags.writeable = False
+    return array
+
+
+class TiepointStore:
+    # the tiepoints of one profile as columns (profile depth, reference depth,
+    # species code, id) sorted by profile depth then reference depth, which is
+    # the order of TiepointMapping.
+    #
+    # A tiepoint is found by bisection and keeps the same integer id for the
+    # life of the store (ids are saved with it), so it can be deleted by id
+    # whatever its position.
+    #
+    # The columns are never modified in place: each insert or delete builds
+    # new arrays, so the read-only views given for plotting and mapping
+    # (or handed to the prefetch thread) stay valid snapshots.
+
+    def __init__(self):
+        self.species_names: list[str] = []
+
+        self._profile_depth: NDArray[np.float64] = _frozen(np.empty(0))
+        self._ref_depth: NDArray[np.float64] = _frozen(np.empty(0))
+        self._species: NDArray[np.int32] = _frozen(np.empty(0, dtype=np.int32))
+        self._ids: NDArray[np.int64] = _frozen(np.empty(0, dtype=np.int64))
+
+        self.next_id = 0
+
+        # depths of each id, to find it by bisection
+        self._depths: dict[int, tuple[float, float]] = {}
+
+    @classmethod
+    def from_tiepoints(cls, tiepoints: Iterable[Tiepoint]):
+        # sorted in one pass, ids follow the order of tiepoints
+        tiepoints = list(tiepoints)
+
+        profile_depth = np.array([bob["profile_depth"] for bob in tiepoints], dtype=np.float64)
+        ref_depth = np.array([bob["ref_depth"] for bob in tiepoints], dtype=np.float64)
+
+        species_names = list(dict.fromkeys(str(bob["species"]) for bob in tiepoints))
+        codes = {species: code for code, species in enumerate(species_names)}
+        species = np.array([codes[str(bob["species"])] for bob in tiepoints], dtype=np.int32)
+
+        order = np.lexsort((ref_depth, profile_depth))
+
+        store = cls()
+        store.__setstate__(
+            {
+                "profile_depth": profile_depth[order],
+                "ref_depth": ref_depth[order],
+                "species": species[order],
+                "species_names": species_names,
+                "ids": order,
+                "next_id": len(tiepoints),
+            }
+        )
+
+        return store
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def profile_depth(self):
+        return self._profile_depth
+
+    @property
+    def ref_depth(self):
+        return self._ref_depth
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def nbytes(self):
+        return sum(
+            array.nbytes
+            for array in (self._profile_depth, self._ref_depth, self._species, self._ids)
+        )
+
+    def species(self, position: int) -> str:
+        return self.species_names[self._species[position]]
+
+    def tiepoint(self, position: int) -> Tiepoint:
+        return Tiepoint(
+            profile_depth=float(self._profile_depth[position]),
+            ref_depth=float(self._ref_depth[position]),
+            species=self.species(position),
+        )
+
+    def __iter__(self) -> Iterator[Tiepoint]:
+        return (self.tiepoint(position) for position in range(len(self)))
+
+    def _bounds(self, profile_depth: float, ref_depth: float) -> tuple[int, int]:
+        # positions of the tiepoints with these depths
+        lo = int(np.searchsorted(self._profile_depth, profile_depth, side="left"))
+        hi = int(np.searchsorted(self._profile_depth, profile_depth, side="right"))
+
+        ref_depth_range = self._ref_depth[lo:hi]
+
+        return (
+            lo + int(np.searchsorted(ref_depth_range, ref_depth, side="left")),
+            lo + int(np.searchsorted(ref_depth_range, ref_depth, side="right")),
+        )
+
+    def position(self, tiepoint_id: int) -> Optional[int]:
+        if tiepoint_id not in self._depths:
+            return None
+
+        lo, hi = self._bounds(*self._depths[tiepoint_id])
+
+        return lo + int(np.flatnonzero(self._ids[lo:hi] == tiepoint_id)[0])
+
+    def find(self, tiepoint: Tiepoint) -> Optional[int]:
+        # id of the first tiepoint equal to tiepoint, None if there is none
+        lo, hi = self._bounds(tiepoint["profile_depth"], tiepoint["ref_depth"])
+
+        for position in range(lo, hi):
+            if self.species(position) == tiepoint["species"]:
+                return int(self._ids[position])
+
+        return None
+
+    def insert(self, profile_depth: float, ref_depth: float, species: str) -> int:
+        # returns the id of the new tiepoint, placed after the equal ones
+        profile_depth = float(profile_depth)
+        ref_depth = float(ref_depth)
+
+        if species not in self.species_names:
+            self.species_names.append(species)
+
+        _, position = self._bounds(profile_depth, ref_depth)
+
+        tiepoint_id = self.next_id
+        self.next_id += 1
+
+        self._profile_depth = _frozen(np.insert(self._profile_depth, position, profile_depth))
+        self._ref_depth = _frozen(np.insert(self._ref_depth, position, ref_depth))
+        self._species = _frozen(
+            np.insert(self._species, position, self.species_names.index(species))
+        )
+        self._ids = _frozen(np.insert(self._ids, position, tiepoint_id))
+
+        self._depths[tiepoint_id] = (profile_depth, ref_depth)
+
+        return tiepoint_id
+
+    def delete(self, tiepoint_id: int) -> Tiepoint:
+        # returns the deleted tiepoint
+        position = self.position(tiepoint_id)
+
+        if position is None:
+            raise KeyError(tiepoint_id)
+
+        tiepoint = self.tiepoint(position)
+
+        self._profile_depth = _frozen(np.delete(self._profile_depth, position))
+        self._ref_depth = _frozen(np.delete(self._ref_depth, position))
+        self._species = _frozen(np.delete(self._species, position))
+        self._ids = _frozen(np.delete(self._ids, position))
+
+        del self._depths[tiepoint_id]
+
+        return tiepoint
+
+    def remove(self, tiepoint: Tiepoint) -> bool:
+        # deletes the first tiepoint equal to tiepoint, as list.remove
+        tiepoint_id = self.find(tiepoint)
+
+        if tiepoint_id is None:
+            return False
+
+        self.delete(tiepoint_id)
+        return True
+
+    def __getstate__(self):
+        # only the columns are saved
+        return {
+            "profile_depth": np.array(self._profile_depth),
+            "ref_depth": np.array(self._ref_depth),
+            "species": np.array(self._species),
+            "species_names": list(self.species_names),
+            "ids": np.array(self._ids),
+            "next_id": self.next_id,
+        }
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.species_names = list(state["species_names"])
+
+        self._profile_depth = _frozen(np.asarray(state["profile_depth"], dtype=np.float64))
+        self._ref_depth = _frozen(np.asarray(state["ref_depth"], dtype=np.float64))
+        self._species = _frozen(np.asarray(state["species"], dtype=np.int32))
+        self._ids = _frozen(np.asarray(state["ids"], dtype=np.int64))
+
+        self.next_id = int(state["next_id"])
+
+        self._depths = {
+            int(tiepoint_id): (float(profile_depth), float(ref_depth))
+            for tiepoint_id, profile_depth, ref_depth in zip(
+                self._ids, self._profile_depth, self._ref_depth
+            )
+        }
+
+
+def as_tiepoint_stores(tiepoints: dict[str, Any]) -> dict[str, TiepointStore]:
+    # alignment files written before the stores hold lists of Tiepoint dicts
+    return {
+        profile: (
+            profile_tiepoints
+            if isinstance(profile_tiepoints, TiepointStore)
+            else TiepointStore.from_tiepoints(profile_tiepoints)
+        )
+        for profile, profile_tiepoints in tiepoints.items()
+    }
@@ -0,0 +1,169 @@
+from typing import Any, Optional
+
+import numpy as np
+
+from .dic import Cores, Dic, Entry
+from .tiepoints import TiepointStore
+
+
+def same_core(core1: Cores, core2: Cores) -> bool:
+    # the shapes are compared first, the arrays only when they could be equal
+    return (
+        core1["depth"].shape == core2["depth"].shape
+        and core1["data"].shape == core2["data"].shape
+        and np.array_equal(core1["depth"], core2["depth"], equal_nan=True)
+        and np.array_equal(core1["data"], core2["data"], equal_nan=True)
+    )
+
+
+def same_value(value1: Any, value2: Any) -> bool:
+    if isinstance(value1, float) and isinstance(value2, float):
+        return value1 == value2 or (np.isnan(value1) and np.isnan(value2))
+
+    return type(value1) is type(value2) and value1 == value2
+
+
+def reference_profile(cores: dict[str, dict[str, Cores]]) -> Optional[str]:
+    # the profile the REF cores were copied from (see initAlignmentFile).
+    # Alignment files keep the arrays shared, otherwise the profile
+    # with the same data is looked for
+    ref_dic = cores.get("REF", {})
+
+    for lab, core_dic in cores.items():
+        if lab != "REF" and any(
+            species in core_dic and core_dic[species]["data"] is core["data"]
+            for species, core in ref_dic.items()
+        ):
+            return lab
+
+    for lab, core_dic in cores.items():
+        if lab != "REF" and all(
+            species in core_dic and same_core(core_dic[species], core)
+            for species, core in ref_dic.items()
+        ):
+            return lab
+
+    return None
+
+
+class DataUpdate:
+    # the changes brought to an alignment file by new cores and metadata
+    # (from parse_files). Only the profiles found in the new files are
+    # compared, so the cost follows the size of the new data, not of the
+    # whole file: the other profiles, and species missing from the new
+    # sheets, are kept as they are. Tiepoints are never touched.
+
+    def __init__(
+        self,
+        dic: Dic,
+        cores: dict[str, dict[str, Cores]],
+        metadata: dict[str, Entry],
+    ):
+        self.dic = dic
+        self.cores = cores
+        self.metadata = metadata
+
+        self.reference = reference_profile(dic["cores"])
+
+        self.added_profiles: list[str] = []
+        self.added: list[tuple[str, str]] = []
+        self.changed: list[tuple[str, str]] = []
+        self.kept: list[tuple[str, str]] = []
+        self.unchanged = 0
+
+        self.metadata_changed: list[str] = []
+
+        for lab, core_dic in cores.items():
+            stored = dic["cores"].get(lab)
+
+            if stored is None:
+                self.added_profiles.append(lab)
+                self.added.extend((lab, species) for species in core_dic.keys())
+                continue
+
+            for species, core in core_dic.items():
+                if species not in stored:
+                    self.added.append((lab, species))
+                elif not same_core(stored[species], core):
+                    self.changed.append((lab, species))
+                else:
+                    self.unchanged += 1
+
+            self.kept.extend((lab, species) for species in stored if species not in core_dic)
+
+        for lab, entry in metadata.items():
+            stored_entry = dic["metadata"].get(lab, {})
+
+            if any(
+                key not in stored_entry or not same_value(stored_entry[key], value)
+                for key, value in entry.items()
+            ):
+                self.metadata_changed.append(lab)
+
+    @property
+    def empty(self):
+        return not (self.added or self.changed or self.metadata_changed)
+
+    @property
+    def modified(self) -> list[tuple[str, str]]:
+        # the (profile, species) cores to write, REF included
+        modified = self.added + self.changed
+
+        return modified + [
+            ("REF", species) for lab, species in modified if lab == self.reference
+        ]
+
+    def apply(self):
+        # updates the cores, metadata and tiepoints of dic in place
+        cores = self.dic["cores"]
+
+        for lab, species in self.added + self.changed:
+            core = self.cores[lab][species]
+
+            cores.setdefault(lab, {})[species] = core
+
+            if lab == self.reference:
+                cores["REF"][species] = core
+
+        for lab in self.added_profiles:
+            if lab not in self.dic["tiepoints"]:
+                self.dic["tiepoints"][lab] = TiepointStore()
+
+        for lab in self.metadata_changed:
+            self.dic["metadata"].setdefault(lab, {}).update(self.metadata[lab])
+
+            if lab == self.reference:
+                self.dic["metadata"]["REF"] = self.dic["metadata"][lab].copy()
+
+    def summary(self) -> str:
+        if self.empty:
+            return f"no change ({self.unchanged} species compared)"
+
+        def names(pairs: list[tuple[str, str]]):
+            return ", ".join(f"{lab}/{species}" for lab, species in pairs)
+
+        lines: list[str] = []
+
+        if self.added_profiles:
+            lines.append("profiles added: " + ", ".join(self.added_profiles))
+
+        if self.added:
+            lines.append("species added: " + names(self.added))
+
+        for lab, species in self.changed:
+            before = len(self.dic["cores"][lab][species]["depth"])
+            after = len(self.cores[lab][species]["depth"])
+            lines.append(f"changed: {lab}/{species} ({before} -> {after} samples)")
+
+        if self.metadata_changed:
+            lines.append("metadata changed: " + ", ".join(self.metadata_changed))
+
+        if self.kept:
+            lines.append("kept (missing from the new files): " + names(self.kept))
+
+        if self.reference in {lab for lab, _ in self.added + self.changed}:
+            lines.append(f"the reference ({self.reference}) is updated too")
+
+        lines.append(f"{self.unchanged} species unchanged")
+
+        return "\n".join(lines)
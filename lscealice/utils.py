@@ -1,61 +1,42 @@
 import numpy as np
 
-from typing import Sequence, cast
-
-from numpy.typing import NDArray
+from numpy.typing import ArrayLike, NDArray
 from matplotlib.axes import Axes
 
-from .magic import combine, transform
+from .magic import combine
 
 
 def af_func(x: NDArray[np.float64], a0: float, a1: float, b0: float, b1: float):
     return b0 + (x - a0) * (a1 - a0) * (b1 - b0)
 
 
-def depth_sqz_str(
-    depth1: NDArray[np.float64], xp1: Sequence[float], xp2: Sequence[float]
-):
-    # Core function of the interpolation, future improvements to be made
-    # JUNE2024: we still need to improve this function for coinciding xp1 points (hiatus)
-    # for now, roughly the same as np.interp but no error if xp1 is empty
-
-    if len(xp2) == 0:
-        return cast(NDArray[np.float64], np.full(depth1.shape, np.nan))
-
-    # sort points
-    xp1, xp2 = zip(*sorted(zip(xp1, xp2)))
-    return np.interp(depth1, xp1[: len(xp2)], xp2)
-
-
-def map_to_ax(
-    ax1: Axes, ax2: Axes, xp1: list[float], yp1: NDArray[np.float64]
-) -> tuple[list[float], list[float]]:
-    # map points with coordinate xp1,xp2 from ax0 to ax1
+def project_points(ax1: Axes, ax2: Axes, xy: ArrayLike) -> NDArray[np.float64]:
+    # map the (N, 2) points xy from the data coordinates of ax1
+    # to the data coordinates of ax2, in a single transform call
 
     combinedTransform = combine(ax2.transData, ax1.transData)
     combinedTransformInv = combinedTransform.inverted()
-    t = transform(combinedTransformInv)
 
-    xyp1 = list(map(t, zip(xp1, yp1)))
-    xp1_on_ax2 = [bob[0] for bob in xyp1]
-    yp1_on_ax2 = [bob[1] for bob in xyp1]
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+
+    if len(xy) == 0:
+        return xy.copy()
 
-    return xp1_on_ax2, yp1_on_ax2
+    return combinedTransformInv.transform(xy)
 
 
 def compute_links(
-    xp1: list[float],
-    xp2: list[float],
-    yp1: list[float],
-    yp2: list[float],
+    xy1: ArrayLike, xy2: ArrayLike
 ) -> tuple[NDArray[np.float64], NDArray[np.float64]]:
-    xp_links: NDArray[np.float64] = np.full(len(xp1) + 2 * len(xp2), np.nan)
-    yp_links: NDArray[np.float64] = xp_links.copy()
+    # one segment per pair of (N, 2) points xy1, xy2, separated by NaN,
+    # to draw all the links as a single line
+    xy1 = np.asarray(xy1, dtype=np.float64).reshape(-1, 2)
+    xy2 = np.asarray(xy2, dtype=np.float64).reshape(-1, 2)
 
-    xp_links[::3] = xp1
-    xp_links[1::3] = xp2
+    links: NDArray[np.float64] = np.full((len(xy1), 3, 2), np.nan)
+    links[:, 0] = xy1
+    links[:, 1] = xy2
 
-    yp_links[::3] = yp1
-    yp_links[1::3] = yp2
+    links = links.reshape(-1, 2)
 
-    return xp_links, yp_links
+    return links[:, 0], links[:, 1]
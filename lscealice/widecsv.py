@@ -0,0 +1,211 @@
+import csv
+import re
+
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .dic import Cores
+
+
+# Wide tables (csv or tsv) with a depth column followed by one column per
+# species and core, named species_core (e.g. "VolSol_core1"), each core
+# only filling the rows of its own depth range.
+
+CSV_EXTENSIONS = (".csv", ".tsv", ".txt")
+
+# species is everything before the last underscore
+CORE_COLUMN = re.compile(r"^(?P<species>.+)_(?P<core>[^_]+)$")
+
+# memory used by each chunk of rows while reading
+CSV_MEMORY_BUDGET = 64 * 2**20
+
+
+def is_csv_file(path: str) -> bool:
+    return path.lower().endswith(CSV_EXTENSIONS)
+
+
+def read_header(path: str) -> tuple[str, list[str]]:
+    # separator and column names, from the first record only. Names are
+    # parsed as pandas reads the rest of the file (quoted names, separators
+    # within quotes), so that their positions match the columns read
+    with open(path, encoding="utf-8-sig", newline="") as fp:
+        first_line = fp.readline()
+
+        sep = "\t" if path.lower().endswith(".tsv") or "\t" in first_line else ","
+
+        fp.seek(0)
+        columns = next(csv.reader(fp, delimiter=sep), [])
+
+    return sep, columns
+
+
+def core_columns(columns: list[str]) -> dict[int, tuple[str, str]]:
+    # (core, species) of the data columns by position, the first one is the depth
+    mapped: dict[int, tuple[str, str]] = {}
+
+    for k, column in enumerate(columns):
+        if k == 0:
+            continue
+
+        match = CORE_COLUMN.match(column.strip())
+
+        if match is None:
+            print("ignored column", column)
+            continue
+
+        mapped[k] = (match.group("core"), match.group("species"))
+
+    return mapped
+
+
+class _ColumnRuns:
+    # samples of one column, collected chunk after chunk: leading and trailing
+    # runs of missing values are dropped and every run in between is kept as
+    # a single NaN, so that gaps still break the line when drawn
+
+    def __init__(self):
+        self.depth: list[NDArray[np.float64]] = []
+        self.data: list[NDArray[np.float64]] = []
+
+        # the last value read was not missing
+        self.last_valid = False
+
+        # depth of the first missing value of the run being read,
+        # written once a value comes after it
+        self.pending: Optional[float] = None
+
+    def add(self, depth: NDArray[np.float64], values: NDArray[np.float64]):
+        if not len(values):
+            return
+
+        valid = ~np.isnan(values)
+        indices = np.flatnonzero(valid)
+
+        if not len(indices):
+            if self.pending is None and self.last_valid:
+                self.pending = float(depth[0])
+            self.last_valid = False
+            return
+
+        # first missing value of each run following a value
+        first_missing = ~valid & np.r_[self.last_valid, valid[:-1]]
+
+        # the run at the end of the chunk may be a trailing one
+        last = indices[-1]
+        if last + 1 < len(values) and first_missing[last + 1]:
+            trailing = float(depth[last + 1])
+        else:
+            trailing = None
+        first_missing[last + 1 :] = False
+
+        if self.pending is not None:
+            self.depth.append(np.array([self.pending]))
+            self.data.append(np.array([np.nan]))
+
+        keep = valid | first_missing
+        self.depth.append(depth[keep])
+        self.data.append(values[keep])
+
+        self.pending = trailing
+        self.last_valid = bool(valid[-1])
+
+    def core(self) -> "Cores":
+        # empty arrays when the values are all out of the depth window
+        if not self.depth:
+            return {"data": np.empty(0), "depth": np.empty(0)}
+
+        return {"data": np.concatenate(self.data), "depth": np.concatenate(self.depth)}
+
+
+def _read_chunks(path: str, memory_budget: int):
+    # (positions of the data columns, reader of the depth and data columns
+    # as float arrays, one chunk of rows at a time)
+    sep, columns = read_header(path)
+    mapped = core_columns(columns)
+
+    # columns are selected by position: the depth column is often unnamed
+    # and names may repeat
+    usecols = [0] + list(mapped.keys())
+
+    chunksize = max(1000, memory_budget // (8 * len(usecols)))
+
+    reader = pd.read_csv(  # type: ignore
+        path,
+        sep=sep,
+        usecols=usecols,
+        dtype=np.float64,
+        na_values=["n.a."],
+        chunksize=chunksize,
+        encoding="utf-8-sig",
+        engine="c",
+    )
+
+    return mapped, reader
+
+
+def read_wide_csv(
+    path: str,
+    min_depth: float = -np.inf,
+    max_depth: float = np.inf,
+    memory_budget: int = CSV_MEMORY_BUDGET,
+) -> dict[str, dict[str, "Cores"]]:
+    # cores[core][species] of a wide table, within the depth window (as
+    # dic.parse_datafile). The file is streamed: cells are parsed as floats
+    # ("n.a." and empty cells are missing values) one chunk of rows at a time,
+    # and only the samples kept are held in memory.
+    # Columns without any value are left out, as in inspect_wide_csv.
+    mapped, reader = _read_chunks(path, memory_budget)
+
+    runs = [_ColumnRuns() for _ in mapped]
+    filled = np.zeros(len(mapped), dtype=bool)
+
+    with reader:
+        for chunk in reader:
+            values = chunk.to_numpy()
+            depth = values[:, 0]
+
+            filled |= ~np.isnan(values[:, 1:]).all(axis=0)
+
+            ind = np.logical_and(depth > min_depth, depth < max_depth)
+            values = values[ind]
+
+            for j, column_runs in enumerate(runs, start=1):
+                column_runs.add(values[:, 0], values[:, j])
+
+    cores: dict[str, dict[str, "Cores"]] = {}
+
+    for j, (core, species) in enumerate(mapped.values()):
+        if filled[j]:
+            cores.setdefault(core, {})[species] = runs[j].core()
+
+    return cores
+
+
+def inspect_wide_csv(
+    path: str, memory_budget: int = CSV_MEMORY_BUDGET
+) -> list[tuple[str, list[str]]]:
+    # (core, species) of the columns with values, in the order of the header.
+    # The file is read until every column has shown a value (all of it
+    # when some are empty)
+    mapped, reader = _read_chunks(path, memory_budget)
+
+    filled = np.zeros(len(mapped), dtype=bool)
+
+    with reader:
+        for chunk in reader:
+            filled |= ~np.isnan(chunk.to_numpy()[:, 1:]).all(axis=0)
+
+            if filled.all():
+                break
+
+    species: dict[str, list[str]] = {}
+
+    for j, (core, name) in enumerate(mapped.values()):
+        if filled[j]:
+            species.setdefault(core, []).append(name)
+
+    return list(species.items())
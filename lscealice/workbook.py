@@ -0,0 +1,242 @@
+import re
+import zipfile
+import posixpath
+
+from typing import Iterator, Optional, TypedDict
+from xml.etree.ElementTree import Element, iterparse
+
+import pandas as pd
+
+from .widecsv import inspect_wide_csv, is_csv_file
+
+
+# Reads what the popups need to know about a workbook (its sheets, their
+# dimensions and column names) from the xml inside the xlsx/ods archive,
+# without loading the cell data as read_excel does.
+
+MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+
+class SheetInfo(TypedDict):
+    name: str
+    # None when the workbook does not tell
+    rows: Optional[int]
+    columns: Optional[int]
+    # the cells of the first row, the species names of a data sheet
+    header: list[str]
+
+
+def _column_index(reference: str) -> int:
+    # 1 based column of a cell reference ("E801" -> 5)
+    index = 0
+    for letter in re.match(r"[A-Z]*", reference.upper()).group():  # type: ignore
+        index = 26 * index + ord(letter) - ord("A") + 1
+    return index
+
+
+def _row_index(reference: str) -> int:
+    digits = re.search(r"\d+", reference)
+    return int(digits.group()) if digits else 0
+
+
+def _text(element: Element) -> str:
+    return "".join(element.itertext())
+
+
+def _shared_strings(archive: zipfile.ZipFile, count: int) -> list[str]:
+    # the first count shared strings: the rest of the table is not read
+    strings: list[str] = []
+
+    if count <= 0 or "xl/sharedStrings.xml" not in archive.namelist():
+        return strings
+
+    with archive.open("xl/sharedStrings.xml") as fp:
+        for _, element in iterparse(fp):
+            if element.tag == MAIN + "si":
+                strings.append(_text(element))
+                element.clear()
+
+                if len(strings) >= count:
+                    break
+
+    return strings
+
+
+ROW_REFERENCE = re.compile(rb"<row\b[^>]*?\br=\"(\d+)\"")
+CELL_REFERENCE = re.compile(rb"<c\b[^>]*?\br=\"([A-Z]+)")
+
+
+def _scan_extent(archive: zipfile.ZipFile, path: str):
+    # last row and column of a sheet without <dimension> element, from the
+    # references of its rows and cells: the xml is scanned, not parsed
+    last_row = 0
+    last_column = 0
+
+    with archive.open(path) as fp:
+        tail = b""
+        for chunk in iter(lambda: fp.read(2**22), b""):
+            # a tag cut at the end of a chunk is found in the next one
+            buffer = tail + chunk
+            tail = buffer[-256:]
+
+            rows = ROW_REFERENCE.findall(buffer)
+            if rows:
+                last_row = max(last_row, int(rows[-1]))
+
+            for letters in set(CELL_REFERENCE.findall(buffer)):
+                last_column = max(last_column, _column_index(letters.decode()))
+
+    return last_row, last_column
+
+
+def _xlsx_sheet(archive: zipfile.ZipFile, name: str, path: str):
+    # dimensions from the <dimension> element and the cells of the first row,
+    # the rest of the sheet is only scanned when the dimension is missing
+    dimension: Optional[str] = None
+
+    # (column, cell type, value) of the first row
+    first_row: list[tuple[int, str, str]] = []
+
+    with archive.open(path) as fp:
+        for event, element in iterparse(fp, events=("start", "end")):
+            if event == "start" and element.tag == MAIN + "dimension":
+                dimension = element.get("ref")
+
+            elif event == "end" and element.tag == MAIN + "row":
+                for cell in element.iter(MAIN + "c"):
+                    kind = cell.get("t", "")
+
+                    if kind == "inlineStr":
+                        text = _text(cell.find(MAIN + "is"))  # type: ignore
+                    else:
+                        value = cell.find(MAIN + "v")
+                        text = value.text or "" if value is not None else ""
+
+                    first_row.append((_column_index(cell.get("r", "")), kind, text))
+
+                break
+
+    if dimension and ":" in dimension:
+        start, end = dimension.split(":")
+        rows = _row_index(end) - _row_index(start) + 1
+        columns = _column_index(end) - _column_index(start) + 1
+    else:
+        rows, columns = _scan_extent(archive, path)
+
+    return name, rows, columns, first_row
+
+
+def _inspect_xlsx(path: str) -> Iterator[SheetInfo]:
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("xl/workbook.xml") as fp:
+            sheets = [
+                (element.get("name", ""), element.get(RELATIONSHIP + "id", ""))
+                for _, element in iterparse(fp)
+                if element.tag == MAIN + "sheet"
+            ]
+
+        with archive.open("xl/_rels/workbook.xml.rels") as fp:
+            targets = {
+                element.get("Id"): element.get("Target", "")
+                for _, element in iterparse(fp)
+                if element.tag == PACKAGE + "Relationship"
+            }
+
+        parsed = []
+        for name, relationship in sheets:
+            target = targets[relationship]
+            target = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+
+            parsed.append(_xlsx_sheet(archive, name, posixpath.normpath(target)))
+
+        # the shared strings of the headers, in a single pass
+        count = 1 + max(
+            [int(text) for *_, first_row in parsed for _, kind, text in first_row if kind == "s"],
+            default=-1,
+        )
+        strings = _shared_strings(archive, count)
+
+    for name, rows, columns, first_row in parsed:
+        header = [strings[int(text)] if kind == "s" else text for _, kind, text in first_row]
+
+        yield SheetInfo(name=name, rows=rows, columns=columns, header=header)
+
+
+def _inspect_ods(path: str) -> Iterator[SheetInfo]:
+    # an ods archive has no dimensions apart from the cells: the rows of
+    # content.xml are streamed (and dropped) to find the last non empty one
+    with zipfile.ZipFile(path) as archive, archive.open("content.xml") as fp:
+        sheet: Optional[SheetInfo] = None
+        row = 0
+
+        for event, element in iterparse(fp, events=("start", "end")):
+            if event == "start" and element.tag == TABLE + "table":
+                sheet = SheetInfo(
+                    name=element.get(TABLE + "name", ""), rows=0, columns=0, header=[]
+                )
+                row = 0
+
+            elif event == "end" and element.tag == TABLE + "table-row" and sheet is not None:
+                repeated = int(element.get(TABLE + "number-rows-repeated", "1"))
+
+                # trailing empty cells are often repeated to the last column
+                cells: list[str] = []
+                blanks = 0
+
+                for cell in element:
+                    if cell.tag in (TABLE + "table-cell", TABLE + "covered-table-cell"):
+                        text = "".join(_text(p) for p in cell.iter(TEXT + "p"))
+                        count = int(cell.get(TABLE + "number-columns-repeated", "1"))
+
+                        if text:
+                            cells += [""] * blanks + [text] * count
+                            blanks = 0
+                        else:
+                            blanks += count
+
+                if row == 0:
+                    sheet["header"] = cells
+
+                row += repeated
+
+                if cells:
+                    sheet["rows"] = row
+                    sheet["columns"] = max(sheet["columns"] or 0, len(cells))
+
+                element.clear()
+
+            elif event == "end" and element.tag == TABLE + "table" and sheet is not None:
+                yield sheet
+                sheet = None
+                element.clear()
+
+
+def inspect_workbook(path: str) -> list[SheetInfo]:
+    # sheets of the workbook, in order
+    if is_csv_file(path):
+        # the cores of a wide table with values: the rows are not counted
+        return [
+            SheetInfo(name=core, rows=None, columns=len(species), header=species)
+            for core, species in inspect_wide_csv(path)
+        ]
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+
+        if "xl/workbook.xml" in names:
+            return list(_inspect_xlsx(path))
+
+        if "content.xml" in names:
+            return list(_inspect_ods(path))
+
+    # other formats (xls...): only the names, through pandas
+    return [
+        SheetInfo(name=str(name), rows=None, columns=None, header=[])
+        for name in pd.ExcelFile(path).sheet_names
+    ]